@@ -3,8 +3,9 @@ __author__ = 'Archie Hickmott'
 import sqlite3
 
 from .orm import Database, Table, Column
+from .sharding import ShardedDatabase, hash_shard, range_shard
 from .sql_data_types import Null, Integer, Real, Text, Blob, \
-                            ALL_SQL_DATA_TYPE_NAMES, ALL_SQL_DATA_TYPES
+                            ALL_SQL_DATA_TYPE_NAMES, ALL_SQL_DATA_TYPES, coerce, coerce_many
 from .sql_functions import *
 from .sql_functions import __all__
 import sqlparse
@@ -12,6 +13,6 @@ import sqlparse
 # print(f"""\033[93mWARNING FortifySQL is in BETA {__version__}, 
 # do not use in a production environment until full release \033[0m""")
 
-__all__ = ['Database', "Table", "column", 
+__all__ = ['Database', "Table", "column", "ShardedDatabase", "hash_shard", "range_shard", 
            "sqlite3", "sqlparse",
-           "Null", "Integer", "Real", "Text", "Blob", "ALL_SQL_DATA_TYPE_NAMES", "ALL_SQL_DATA_TYPES", *__all__]
+           "Null", "Integer", "Real", "Text", "Blob", "ALL_SQL_DATA_TYPE_NAMES", "ALL_SQL_DATA_TYPES", "coerce", "coerce_many", *__all__]
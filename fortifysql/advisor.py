@@ -0,0 +1,187 @@
+"""
+Index advisor, recommends indexes from the ORM selects a database has run, see Database.advise_indexes()
+"""
+import math
+from typing import Any, Dict, List, Tuple
+
+import sqlparse
+from sqlparse.sql import Comparison, Identifier, IdentifierList, Parenthesis, Where
+from sqlparse.tokens import Keyword, Operator
+
+# rows sampled to estimate how many distinct values an unindexed column has
+_SAMPLE_ROWS = 10000
+
+# operators an index can use like an equality, columns compared with them go first in a composite index
+_EQUALITY = {"=", "==", "IS", "IN"}
+
+def advise(db, min_executions: int = 1, max_covering_columns: int = 3) -> List[Dict[str, Any]]:
+    """builds the index report for Database.advise_indexes() from db.workload
+
+    Args:
+        db (Database): database with workload tracking on
+        min_executions (int, optional): selects ran fewer times than this are ignored. Defaults to 1.
+        max_covering_columns (int, optional): most selected columns added to make an index covering. Defaults to 3.
+
+    Returns:
+        List[Dict[str, Any]]: recommended indexes, biggest estimated benefit first
+    """
+    advice = {}
+    for template, entry in list(db.workload.items()):
+        if entry["executions"] < min_executions:
+            continue
+        for table, columns, covering, reason, rows_saved in _recommend(db, entry["statement"], entry, max_covering_columns):
+            key = (str(table), tuple(columns))
+            if key not in advice:
+                schema, _, name = str(table).rpartition(".")
+                index = f"fortify_idx_{name}_{'_'.join(columns)}"
+                advice[key] = {"table": str(table), "columns": columns, "covering": covering, "reason": reason,
+                               "sql": f"CREATE INDEX IF NOT EXISTS {schema + '.' if schema else ''}{index} ON {name} ({', '.join(columns)})",
+                               "statements": [], "executions": 0, "total_time": 0.0, "rows": db._estimate_rows(schema or "main", name),
+                               "estimated_rows_saved": 0, "benefit": 0}
+            item = advice[key]
+            item["statements"].append(template)
+            item["executions"] += entry["executions"]
+            item["total_time"] += entry["time"]
+            item["estimated_rows_saved"] = max(item["estimated_rows_saved"], rows_saved)
+            item["benefit"] += rows_saved * entry["executions"]
+    report = list(advice.values())
+    for item in report:
+        item["avg_time"] = item["total_time"] / item["executions"]
+    report.sort(key=lambda item: (item["benefit"], item["total_time"]), reverse=True)
+    return report
+
+def _recommend(db, statement: str, entry: dict, max_covering_columns: int) -> List[Tuple[Any, List[str], bool, str, int]]:
+    """the indexes that would help one statement: (table, columns, covering, reason, estimated rows saved per run)"""
+    tables = entry["tables"]
+    equal, ranges, order, joins = _clause_columns(statement, tables)
+    try:
+        with db.lock:
+            plan = db._query_plan(statement, entry["parameters"])
+            scans = {table for _, table in db._full_scans(statement, entry["parameters"])}
+    except Exception: # the statement can't be planned anymore (e.g. a table was dropped)
+        return []
+    temp_sort = any("TEMP B-TREE FOR ORDER BY" in detail for detail in plan)
+
+    recommendations = []
+    for n, table in enumerate(tables):
+        schema, _, name = str(table).rpartition(".")
+        columns = [col for col, owner in (*equal, *joins) if owner is table]
+        range_columns = [col for col, owner in ranges if owner is table]
+        columns = list(dict.fromkeys(columns))
+        reason = "full scan"
+        if range_columns and range_columns[0] not in columns:
+            columns.append(range_columns[0])
+        if n == 0 and order and all(owner is table for _, owner, _ in order) and len({desc for _, _, desc in order}) == 1 \
+                and (range_columns == [] or range_columns[0] == order[0][0]):
+            if temp_sort and name not in scans:
+                reason = "sort for ORDER BY"
+            columns += [col for col, _, _ in order if col not in columns]
+        if columns == [] or (name not in scans and reason != "sort for ORDER BY"):
+            continue
+        if _has_index(db, table, columns):
+            continue
+
+        selected = [_resolve(col, tables) for col in entry["cols"]]
+        covering = False
+        if selected and all(owner is not None for _, owner in selected):
+            extra = list(dict.fromkeys(col for col, owner in selected if owner is table and col not in columns))
+            if len(extra) <= max_covering_columns:
+                columns += extra
+                covering = True
+
+        # rows read per run, an index lookup costs log2(rows) plus the matching rows, a range matches about a quarter
+        rows = db._estimate_rows(schema or "main", name)
+        lookup = math.log2(rows + 1)
+        read_after = lookup + (rows / 4 if columns[0] in range_columns else _rows_per_key(db, table, columns[0], rows))
+        read_now = rows if name in scans else read_after * lookup # the rows are found already but sorted afterwards
+        recommendations.append((table, columns, covering, reason, int(max(read_now - read_after, 0))))
+    return recommendations
+
+def _has_index(db, table, columns: List[str]) -> bool:
+    """checks if an existing index starts with columns"""
+    schema, _, _ = str(table).rpartition(".")
+    with db.lock:
+        for index in db.conn.execute(table._pragma("index_list")).fetchall():
+            info = db.conn.execute(f"PRAGMA {schema + '.' if schema else ''}index_info({index[1]})").fetchall()
+            indexed = [row[2] for row in sorted(info, key=lambda row: row[0])]
+            if [col.lower() for col in indexed[:len(columns)]] == [col.lower() for col in columns]:
+                return True
+    return False
+
+def _rows_per_key(db, table, column: str, rows: int) -> float:
+    """average rows that share a value of column, from sqlite_stat1 if an analyzed index starts with it or a sample if not"""
+    schema, _, name = str(table).rpartition(".")
+    prefix = schema + "." if schema else ""
+    with db.lock:
+        try:
+            stats = db.conn.execute(f"SELECT idx, stat FROM {prefix}sqlite_stat1 WHERE tbl=?", (name,)).fetchall()
+        except Exception: # never analyzed
+            stats = []
+        for index, stat in stats:
+            if index is None:
+                continue
+            info = db.conn.execute(f"PRAGMA {prefix}index_info({index})").fetchall()
+            first = [row[2] for row in info if row[0] == 0]
+            if first and first[0].lower() == column.lower():
+                return float(stat.split()[1])
+        sample, distinct = db.conn.execute(f"SELECT count(*), count(DISTINCT {column}) FROM "
+                                           f"(SELECT {column} FROM {table} LIMIT {_SAMPLE_ROWS})").fetchone()
+    if sample == 0:
+        return 0.0
+    return sample / max(distinct, 1) * max(rows / sample, 1) # scale the sample up to the whole table
+
+def _resolve(identifier: Any, tables: list) -> Tuple[str, Any]:
+    """finds the (column name, Table) an identifier refers to, the Table is None if it isn't a column of the tables"""
+    if isinstance(identifier, Identifier):
+        parent, name = identifier.get_parent_name(), identifier.get_real_name()
+    else:
+        parent, _, name = (repr(identifier) if hasattr(identifier, "table") else str(identifier)).rpartition(".") # Columns as table.column
+        parent = parent.rsplit(".", 1)[-1] or None
+    if name is None:
+        return "", None
+    for table in tables:
+        if parent is not None and parent.lower() not in (str(table).lower(), str(table).rsplit(".", 1)[-1].lower()):
+            continue
+        for column in table.columns:
+            if column.name.lower() == name.lower():
+                return column.name, table
+    return name, None
+
+def _clause_columns(statement: str, tables: list) -> Tuple[list, list, list, list]:
+    """splits the columns a select uses into equality and range WHERE columns, ORDER BY columns and JOIN ON columns"""
+    equal, ranges, order, joins = [], [], [], []
+    parsed = sqlparse.parse(statement)[0]
+    tokens = [token for token in parsed.tokens if not token.is_whitespace]
+
+    def add(token, kind: list) -> None:
+        if isinstance(token, Identifier):
+            column, table = _resolve(token, tables)
+            if table is not None:
+                kind.append((column, table))
+
+    def where(group) -> None:
+        members = [token for token in group.tokens if not token.is_whitespace]
+        for n, token in enumerate(members):
+            if isinstance(token, Comparison):
+                operator = [t.normalized.upper() for t in token.tokens if t.ttype in Operator.Comparison]
+                add(token.left, equal if operator and operator[0] in _EQUALITY else ranges)
+            elif isinstance(token, Identifier):
+                following = members[n + 1].normalized.upper() if n + 1 < len(members) else ""
+                add(token, equal if following in _EQUALITY else ranges)
+            elif isinstance(token, Parenthesis):
+                where(token)
+
+    for n, token in enumerate(tokens):
+        if isinstance(token, Where):
+            where(token)
+        elif token.ttype in Keyword and token.normalized == "ON" and n + 1 < len(tokens) and isinstance(tokens[n + 1], Comparison):
+            add(tokens[n + 1].left, joins)
+            add(tokens[n + 1].right, joins)
+        elif token.ttype in Keyword and token.normalized == "ORDER BY" and n + 1 < len(tokens):
+            items = tokens[n + 1].get_identifiers() if isinstance(tokens[n + 1], IdentifierList) else [tokens[n + 1]]
+            for item in items:
+                if isinstance(item, Identifier):
+                    column, table = _resolve(item, tables)
+                    if table is not None:
+                        order.append((column, table, item.get_ordering() == "DESC"))
+    return equal, ranges, order, joins
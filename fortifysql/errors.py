@@ -20,4 +20,36 @@ class SecurityError(FortifySQLError):
     """Used when a security rule is broken"""
     def __init__(self, msg):
         super().__init__(f"Error, Broken Security Rule: {msg}")  
- 
\ No newline at end of file
+ 
+
+class DatabaseBusyError(FortifySQLError):
+    """Used when the database is still locked by another connection after retrying"""
+    def __init__(self, msg):
+        super().__init__(f"Database busy: {msg}")
+
+class QueryTimeoutError(FortifySQLError):
+    """Used when a query runs longer than its timeout and is interrupted"""
+    def __init__(self, msg):
+        super().__init__(f"Query timed out: {msg}")
+
+
+class QueryCancelledError(FortifySQLError):
+    """Used when a running query is interrupted with Database.cancel()"""
+    def __init__(self, msg):
+        super().__init__(f"Query cancelled: {msg}")
+
+
+class ResultTooLargeError(FortifySQLError):
+    """Used when a query result goes over the result budget and the policy is "error" """
+    def __init__(self, msg):
+        super().__init__(f"Result too large: {msg}")
+
+
+class FullScanError(FortifySQLError):
+    """Used when a statement would scan a whole table that is bigger than the scan guard allows"""
+    def __init__(self, msg):
+        super().__init__(f"Full table scan: {msg}")
+
+
+class FullScanWarning(UserWarning):
+    """Warned when a statement scans a whole table that is bigger than the scan guard allows and the action is "warn" """
@@ -0,0 +1,168 @@
+"""
+Background maintenance (PRAGMA optimize, ANALYZE, incremental vacuum, WAL checkpoints), see Database.maintenance()
+"""
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Any, Dict
+
+class Maintenance:
+    """Runs maintenance on a database from a background thread while it's idle, the connection is never held
+    for longer than the budget so foreground queries wait at most that long"""
+    def __init__(self, db, interval: float = 60.0, idle: float = 1.0, budget: float = 0.1, analysis_limit: int = 400,
+                 analyze_interval: float = 3600.0, vacuum_pages: int = 100, truncate_wal_frames: int = 1000) -> None:
+        """Runs maintenance on a database from a background thread while it's idle
+
+        Args:
+            db (Database): database to maintain, only a weak reference is kept
+            interval (float, optional): seconds between maintenance runs. Defaults to 60.0.
+            idle (float, optional): seconds without queries before the database counts as idle. Defaults to 1.0.
+            budget (float, optional): most seconds a run can hold the connection, longer statements are interrupted. Defaults to 0.1.
+            analysis_limit (int, optional): rows ANALYZE and PRAGMA optimize look at per index (PRAGMA analysis_limit). Defaults to 400.
+            analyze_interval (float, optional): seconds between full ANALYZE runs, PRAGMA optimize runs every time. Defaults to 3600.0.
+            vacuum_pages (int, optional): free pages returned to the OS per run, needs auto_vacuum = INCREMENTAL. Defaults to 100.
+            truncate_wal_frames (int, optional): WAL size in frames after which the checkpoint truncates the WAL file. Defaults to 1000.
+        """
+        self.db = weakref.ref(db)
+        self.interval = interval
+        self.idle = idle
+        self.budget = budget
+        self.analysis_limit = analysis_limit
+        self.analyze_interval = analyze_interval
+        self.vacuum_pages = vacuum_pages
+        self.truncate_wal_frames = truncate_wal_frames
+        self.stats = {"runs": 0, "skipped": 0, "interrupted": 0, "errors": 0, "last_run": None, "last_duration": 0.0, "last": {}}
+        self.__stats_lock = threading.Lock() # run() can be called from any thread as well as the maintenance thread
+        self.__last_analyze = None
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.__loop, name="fortifysql-maintenance", daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        """stops the maintenance thread, waiting for a run in progress to finish"""
+        self.stop.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def __loop(self) -> None:
+        while not self.stop.wait(self.interval):
+            if not self.__wait_for_idle():
+                continue
+            db = self.db()
+            if db is None:
+                return
+            self.run(db)
+            del db
+
+    def __wait_for_idle(self) -> bool:
+        """waits until no queries have ran for idle seconds, False if that didn't happen within interval seconds or it was stopped"""
+        give_up = time.monotonic() + self.interval
+        while True:
+            db = self.db()
+            if db is None:
+                return False
+            quiet = time.monotonic() - db.last_activity
+            del db
+            if quiet >= self.idle:
+                return True
+            if time.monotonic() >= give_up:
+                self.__count("skipped")
+                return False
+            if self.stop.wait(self.idle - quiet):
+                return False
+
+    def run(self, db=None) -> Dict[str, Any]:
+        """runs maintenance now, in the calling thread. Skipped if the connection can't be taken within the budget
+        or a transaction is open. The connection's busy timeout and other deadlines are put back afterwards, and 
+        the read connections and in memory copy are reloaded after an ANALYZE so they plan with the new statistics
+
+        Returns:
+            Dict[str, Any]: what was done, the keys are optimize, analyze, vacuumed_pages and checkpoint (missing if not reached),
+                and error if a statement failed or was interrupted by the budget
+        """
+        db = db or self.db()
+        results = {}
+        if db is None or not db.lock.acquire(timeout=self.budget):
+            self.__count("skipped")
+            return results
+        start = time.monotonic()
+        conn = db.conn
+        try:
+            if db.transaction_depth > 0 or conn.in_transaction:
+                self.__count("skipped")
+                return results
+            busy_timeout = _pragma(conn, "PRAGMA busy_timeout")[0][0]
+            deadline = db._start_deadline(conn, self.budget) # shares the progress handler with queries' deadlines
+            _pragma(conn, f"PRAGMA busy_timeout = {int(self.budget * 1000)}")
+            try:
+                for name, task in (("optimize", self.__optimize), ("analyze", self.__analyze),
+                                   ("vacuumed_pages", self.__vacuum), ("checkpoint", self.__checkpoint)):
+                    if time.monotonic() >= deadline:
+                        break
+                    results[name] = task(conn)
+                if results.get("analyze"):
+                    db._forget_plans()
+            except sqlite3.Error as e:
+                results["error"] = str(e)
+                self.__count("interrupted" if "interrupted" in str(e) else "errors")
+            finally:
+                db._end_deadline(conn, deadline)
+                _pragma(conn, f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        finally:
+            db.lock.release()
+        if results.get("analyze"):
+            db._reload_statistics()
+        with self.__stats_lock:
+            self.stats["runs"] += 1
+            self.stats["last_run"] = time.time()
+            self.stats["last_duration"] = time.monotonic() - start
+            self.stats["last"] = results
+        return results
+
+    def __count(self, name: str) -> None:
+        """adds one to a counter in stats"""
+        with self.__stats_lock:
+            self.stats[name] += 1
+
+    def __optimize(self, conn: sqlite3.Connection) -> bool:
+        """PRAGMA optimize, runs ANALYZE on the tables whose statistics are out of date"""
+        _pragma(conn, f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+        _pragma(conn, "PRAGMA optimize")
+        return True
+
+    def __analyze(self, conn: sqlite3.Connection) -> bool:
+        """a full ANALYZE limited by analysis_limit, once every analyze_interval seconds"""
+        if self.__last_analyze is not None and time.monotonic() - self.__last_analyze < self.analyze_interval:
+            return False
+        _pragma(conn, "ANALYZE")
+        self.__last_analyze = time.monotonic()
+        return True
+
+    def __vacuum(self, conn: sqlite3.Connection) -> int:
+        """returns up to vacuum_pages free pages to the OS, only if the database uses auto_vacuum = INCREMENTAL"""
+        if _pragma(conn, "PRAGMA auto_vacuum")[0][0] != 2:
+            return 0
+        free = _pragma(conn, "PRAGMA freelist_count")[0][0]
+        _pragma(conn, f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+        return free - _pragma(conn, "PRAGMA freelist_count")[0][0]
+
+    def __checkpoint(self, conn: sqlite3.Connection) -> Dict[str, Any] | None:
+        """a PASSIVE WAL checkpoint, followed by a TRUNCATE one if the WAL is over truncate_wal_frames and fully checkpointed"""
+        if _pragma(conn, "PRAGMA journal_mode")[0][0].lower() != "wal":
+            return None
+        mode = "PASSIVE"
+        busy, log, done = _pragma(conn, "PRAGMA wal_checkpoint(PASSIVE)")[0]
+        if log >= self.truncate_wal_frames and done == log:
+            mode = "TRUNCATE"
+            busy, log, done = _pragma(conn, "PRAGMA wal_checkpoint(TRUNCATE)")[0]
+        return {"mode": mode, "busy": bool(busy), "log": log, "checkpointed": done}
+
+def _pragma(conn: sqlite3.Connection, statement: str) -> list:
+    """runs a maintenance statement and returns its rows as tuples whatever the row factory is"""
+    cur = conn.cursor()
+    cur.row_factory = None
+    try:
+        return cur.execute(statement).fetchall()
+    finally:
+        cur.close()
@@ -2,20 +2,67 @@ import re
 import sqlite3
 import os
 import time
+import pathlib
 import random
 import json
-from typing import Callable, Iterable, List, Any, Self, Tuple
+import threading
+import weakref
+import csv
+import gzip
+import itertools
+import inspect
+import warnings
+from array import array
+from collections import deque, OrderedDict
+from functools import lru_cache, wraps
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Any, Self, Tuple
 
 import sqlparse
 from prettytable import PrettyTable
+try:
+    import numpy
+except ImportError: # numpy is optional, only used by Selectable.to_columns()
+    numpy = None
 
 from .utils import is_drop_query, is_dangerous_delete
-from .errors import FortifySQLError, DatabaseConfigError, SecurityError
-from .sql_data_types import get_dtype, LogicalString, primitives
+from .errors import FortifySQLError, DatabaseConfigError, SecurityError, SQLTypeError, DatabaseBusyError, \
+                    QueryTimeoutError, QueryCancelledError, ResultTooLargeError, FullScanError, FullScanWarning
+from .writer import WriteBehind
+from .maintenance import Maintenance
+from .spill import SpilledResult, row_size
+from . import advisor
+from .sql_functions import function_builder
+from .sql_data_types import get_dtype, coerce, coerce_many, LogicalString, primitives, Integer, Real, Blob, Text
+
+# statement types that write, ran inside BEGIN IMMEDIATE so the write lock is taken up front
+_WRITE_STATEMENTS = {"INSERT", "UPDATE", "DELETE", "REPLACE", "UPSERT", "CREATE", "DROP", "ALTER"}
+
+# highest number of ? parameters SQLite allows in one statement (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+# SQLite virtual machine instructions between checks of a query's deadline
+_PROGRESS_STEPS = 1000
+
+# rows fetched at a time while checking a result against the result budget
+_BUDGET_BATCH = 256
+
+# statement types the scan guard runs EXPLAIN QUERY PLAN on, and how many plans it remembers
+_SCAN_CHECKED = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+_SCAN_PLAN_CACHE = 1024
+
+# built in aggregate functions and clauses that need every row of a result at once, see Select.parallel_map()
+_AGGREGATES = {"count", "sum", "total", "avg", "min", "max", "group_concat", "string_agg", "json_group_array", "json_group_object"}
+_WHOLE_RESULT_CLAUSES = {"GROUP BY", "HAVING", "ORDER BY", "LIMIT", "OFFSET", "UNION", "UNION ALL", "INTERSECT", "EXCEPT", "WINDOW"}
+
+# most statement templates the workload tracker keeps, the least recently ran are forgotten first
+_WORKLOAD_STATEMENTS = 1000
 
 class Database:
     # initialise connection to database
-    def __init__(self, path: str, check_same_thread: bool=False, name: str = "") -> None:
+    def __init__(self, path: str, check_same_thread: bool=False, name: str = "", read_connections: int = 0,
+                 in_memory_copy: bool = False, refresh_interval: float = 1.0) -> None:
         """Create a connection to a database, checks if the database exists
             when loading in tables, the table will be an attribute of the database class the attribute name matches the table name
             however if the attribute already exists the table will be renamed to tbl_{table name}
@@ -24,9 +71,17 @@ class Database:
             path (str): path to the database
             check_same_thread (bool, optional): used to check if a query is made on the same thread as the __main__ thread. Defaults to False.
             name (str, optional): used to give the database a custom name. Defaults to "".
+            read_connections (int, optional): number of extra read only connections SELECT statements are shared between (round robin), 
+                the database is switched to WAL so reads run alongside writes. Defaults to 0.
+            in_memory_copy (bool, optional): copy the database file into memory and run every SELECT on the copy, 
+                for read heavy databases that rarely change. Defaults to False.
+            refresh_interval (float, optional): seconds between checks of PRAGMA data_version, when the file has changed 
+                the in memory copy is reloaded in the background and swapped in, until then reads after a write made 
+                through this database run on the main connection (if read_your_writes is on). Defaults to 1.0.
 
         Raises:
             FortifySQLError: when the database doesn't exist
+            FortifySQLError: when read_connections or in_memory_copy is used with :memory:
         """
         if os.path.isfile(path):
             if name == "":
@@ -51,24 +106,97 @@ class Database:
         self.cur = None
         self.path = path
         self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.lock = threading.RLock() # held while the connection is used, so threads can share the Database
+        self.trace_callback = None
+        self.writer = None
+        self.maintainer = None
+        self.last_activity = time.monotonic()
+        self.__local = threading.local() # transaction() depth is per thread, see transaction_depth
         self.recent_data = None
+
+        if (read_connections > 0 or in_memory_copy) and path == ":memory:":
+            raise FortifySQLError("read_connections and in_memory_copy can't be used with a :memory: database")
+        self.read_your_writes = True
+        self.attached = {}
+        self.functions = {}
+        self.read_conns = []
+        if read_connections > 0:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.read_conns = [self._connect_read_only() for _ in range(read_connections)]
+        self.__read_cycle = itertools.cycle(range(read_connections))
+        self.memory_conn = None
+        self.__swap_lock = threading.Lock() # held while routing to or swapping out a read connection or the in memory copy
+        self.__in_use = {} # read connection / in memory copy -> queries and cursors using it
+        self.__retired = set() # swapped out connections closed once they're no longer in use
+        self.writes = 0 # writes started through this database, reads skip the in memory copy until it has loaded them
+        self.memory_writes = 0
+        self.refresh_interval = refresh_interval
+        self.__stop_refresh = threading.Event()
+        if in_memory_copy:
+            watcher = self._connect_read_only()
+            version = watcher.execute("PRAGMA data_version").fetchone()[0]
+            self.memory_conn = self._load_memory_copy()
+            threading.Thread(target=_refresh_memory_copy, name="fortifysql-refresh", daemon=True,
+                             args=(weakref.ref(self), watcher, version, self.__stop_refresh)).start()
+        self.retry_policy()
+        self.default_timeout = None
+        self.__deadlines = {}
+        self.__deadlines_lock = threading.Lock() # not self.lock, so reads on other connections don't wait for a transaction
+        self.timeout_stats = {"timeouts": 0, "cancelled": 0}
+        self.result_max_bytes = None
+        self.result_policy = "spill"
+        self.scan_min_rows = None
+        self.scan_action = "error"
+        self.scan_allowlist = set()
+        self.__scan_plans = OrderedDict()
+        self.__scan_plans_schema = None # schema_version of every schema when the plans were made
+        self.workload = None
         
         self.reload_tables()
 
     # to safely close database
+    def close(self) -> None:
+        """Writes everything queued by write_behind(), stops maintenance and the in memory copy's refresh, 
+        rolls back any uncommited transaction and closes every connection. Safe to call more than once, 
+        also called on garbage collection and at the end of a with block: with Database(path) as db: ..."""
+        if getattr(self, "writer", None) is not None:
+            self.writer.close()
+        if getattr(self, "maintainer", None) is not None:
+            self.maintainer.close()
+        if getattr(self, "conn", None) is not None:
+            self.conn.rollback()
+            self.conn.close()
+            self.conn = None
+        for conn in getattr(self, "read_conns", []):
+            conn.close()
+        self.read_conns = []
+        if getattr(self, "memory_conn", None) is not None:
+            self.__stop_refresh.set()
+            self.memory_conn.close()
+            self.memory_conn = None
+        for conn in getattr(self, "_Database__retired", ()):
+            conn.close()
+        self.__retired = set()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
     def __del__(self) -> None:
         """
         Rolls back any uncommited transactions on garbage collection
         """
-        if self.conn is not None:
-            self.conn.rollback()
-            self.conn.close()
+        self.close()
                 
     def reload_tables(self):
         reserved_names = ["error", "allow_dropping", "check_delete_statements", "error_logging", "banned_statements", "banned_syntax",
-                          "cur", "path", "conn", "recent_data", "tables", "logging"]
+                          "cur", "path", "conn", "close", "recent_data", "tables", "logging", "lock", "writer", "maintainer", "last_activity", "read_conns", "read_your_writes", "memory_conn", "writes", "memory_writes", "refresh_interval", "trace_callback",
+                          "transaction_depth", "attached", "functions", "default_timeout", "timeout_stats", "result_max_bytes", "result_policy", "scan_min_rows", "scan_action", "scan_allowlist", "workload", "busy_timeout", "max_retries", "backoff", "max_backoff", "max_elapsed", "busy_stats"]
         self.tables = []
-        raw_tables = self.query("SELECT name, sql, tbl_name FROM sqlite_master WHERE type='table'")
+        with self.lock: # the schema is read from the main connection, the in memory copy or a read connection can be behind
+            raw_tables = [list(row) for row in self.conn.execute("SELECT name, sql, tbl_name FROM sqlite_master WHERE type='table'").fetchall()]
         for table in raw_tables:
             if table[0] in reserved_names:
                 table[0] = f"tbl_{table[0]}"
@@ -114,6 +242,14 @@ class Database:
             self.query_logging(True)
         if config["default_row_factory"]:
             self.row_factory(sqlite3.Row)
+        if "retry_policy" in config:
+            self.retry_policy(**config["retry_policy"])
+        if "query_timeout" in config:
+            self.query_timeout(config["query_timeout"])
+        if "result_budget" in config:
+            self.result_budget(**config["result_budget"])
+        if "scan_guard" in config:
+            self.scan_guard(**config["scan_guard"])
 
     def logger(self, statement: str) -> None:
         """used to log queries
@@ -152,12 +288,103 @@ class Database:
             func (Callable | None, optional): function used to log queries. Defaults to None.
         """
         if not enable:
-            self.conn.set_trace_callback(None)
+            self.trace_callback = None
+        elif func is None:
+            self.trace_callback = self.logger
+        else:
+            self.trace_callback = func
+        for conn in self._connections():
+            conn.set_trace_callback(self.trace_callback)
+
+    def query_timeout(self, timeout: float | None) -> None:
+        """Sets the default timeout of query(), execute() and everything built on them (Select.all(), Table.get_many(), export() etc.), 
+        statements running longer are interrupted and raise QueryTimeoutError. Streamed results are timed until the cursor is closed 
+        or every row is fetched. A timeout given to a single query overrides it
+
+        Args:
+            timeout (float | None): seconds a statement can run for, None for no timeout
+        """
+        self.default_timeout = timeout
+
+    def result_budget(self, max_bytes: int | None, policy: str = "spill") -> None:
+        """Limits how much memory the result of one query() can take up, results are fetched in batches and their size estimated,
+        once a result is bigger than max_bytes the policy decides what happens: \n
+        "spill" writes the rest of the rows to a temporary file and returns a SpilledResult, which works like a list and reads rows back when needed \n
+        "error" stops fetching and raises ResultTooLargeError
+
+        Args:
+            max_bytes (int | None): most bytes a result can use, None for no limit
+            policy (str, optional): "spill" or "error". Defaults to "spill".
+
+        Raises:
+            FortifySQLError: if policy isn't "spill" or "error"
+        """
+        if policy not in ("spill", "error"):
+            raise FortifySQLError(f"""result_budget() policy must be "spill" or "error", got {policy}""")
+        self.result_max_bytes = max_bytes
+        self.result_policy = policy
+
+    def cancel(self) -> None:
+        """Interrupts the statements running on every connection of the database, they raise QueryCancelledError. 
+        Called from another thread than the one running the query, statements started afterwards aren't affected
+        """
+        for conn in self._connections():
+            conn.interrupt()
+
+    @contextmanager
+    def _deadline(self, conn: sqlite3.Connection, timeout: float | None = None):
+        """interrupts statements on conn that run longer than timeout (or the default timeout) with the progress handler,
+        interrupted statements raise QueryTimeoutError or QueryCancelledError"""
+        deadline = self._start_deadline(conn, timeout)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            error = self._interrupted(e, deadline)
+            if error is e:
+                raise e
+            raise error from e
+        finally:
+            self._end_deadline(conn, deadline)
+
+    def _start_deadline(self, conn: sqlite3.Connection, timeout: float | None = None) -> float | None:
+        """adds a deadline to the progress handler of conn, returns it (None if there's no timeout) for _end_deadline(). 
+        Every deadline on a connection is checked by one handler, so streamed cursors and queries can share a connection"""
+        if timeout is None:
+            timeout = self.default_timeout
+        if timeout is None:
             return None
-        if func is None:
-            self.conn.set_trace_callback(self.logger)
+        deadline = time.monotonic() + timeout
+        with self.__deadlines_lock:
+            deadlines = self.__deadlines.get(conn)
+            if deadlines is None:
+                deadlines = self.__deadlines[conn] = []
+                conn.set_progress_handler(lambda: time.monotonic() > min(deadlines), _PROGRESS_STEPS)
+            deadlines.append(deadline)
+        return deadline
+
+    def _end_deadline(self, conn: sqlite3.Connection, deadline: float | None) -> None:
+        """removes a deadline added with _start_deadline(), the progress handler is removed with the last one"""
+        if deadline is None:
+            return
+        with self.__deadlines_lock:
+            deadlines = self.__deadlines.get(conn, [])
+            if deadline in deadlines:
+                deadlines.remove(deadline)
+            if deadlines == [] and conn in self.__deadlines:
+                del self.__deadlines[conn]
+                conn.set_progress_handler(None, _PROGRESS_STEPS)
+
+    def _interrupted(self, error: sqlite3.OperationalError, deadline: float | None) -> Exception:
+        """the error to raise for an error from a statement with a deadline, QueryTimeoutError or QueryCancelledError if it was interrupted"""
+        if "interrupted" not in str(error):
+            return error
+        if deadline is not None and time.monotonic() > deadline:
+            self.timeout_stats["timeouts"] += 1
+            error = QueryTimeoutError(f"statement ran past its timeout on {self.path}")
         else:
-            self.conn.set_trace_callback(func)
+            self.timeout_stats["cancelled"] += 1
+            error = QueryCancelledError(f"statement was interrupted with cancel() on {self.path}")
+        return error
 
     #allows dev to set the row factory
     def row_factory(self, factory: sqlite3.Row | Callable = sqlite3.Row) -> None:
@@ -166,7 +393,190 @@ class Database:
         Args:
             factory (sqlite3.Row | Callable, optional): function or sqlite3.Row class used for a row factory Defaults to sqlite3.Row.
         """
-        self.conn.row_factory = factory
+        for conn in self._connections():
+            conn.row_factory = factory
+
+    def _connections(self) -> List[sqlite3.Connection]:
+        """every connection the database has, settings like the row factory are applied to all of them"""
+        return [self.conn, *self.read_conns, *([self.memory_conn] if self.memory_conn is not None else [])]
+
+    def _connect_read_only(self) -> sqlite3.Connection:
+        """opens a read only connection to the database file, with query_only on as a second guard"""
+        uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        conn.row_factory = self.conn.row_factory
+        conn.set_trace_callback(self.trace_callback)
+        for alias, path in self.attached.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        for key, registration in self.functions.items():
+            _create_function(conn, *key, *registration)
+        return conn
+
+    def _read_connection(self, statement_type: str) -> sqlite3.Connection:
+        """picks the connection a statement runs on, SELECTs go to the in memory copy or the read connections round robin 
+        unless read_your_writes is on and the calling thread has a transaction open (or the in memory copy hasn't loaded 
+        this database's last write yet), everything else goes to the main connection. Doesn't need the lock"""
+        if statement_type != "SELECT" or (self.read_conns == [] and self.memory_conn is None):
+            return self.conn
+        if self.read_your_writes and self.transaction_depth > 0:
+            return self.conn
+        if self.memory_conn is not None:
+            if self.read_your_writes and self.memory_writes < self.writes:
+                return self.conn
+            return self.memory_conn
+        return self.read_conns[next(self.__read_cycle)]
+
+    def _load_memory_copy(self) -> sqlite3.Connection:
+        """copies the database file into a new read only :memory: connection with the backup API"""
+        source = self._connect_read_only()
+        memory = sqlite3.connect(":memory:", check_same_thread=False)
+        try:
+            source.backup(memory)
+        finally:
+            source.close()
+        memory.execute("PRAGMA query_only = 1")
+        memory.row_factory = self.conn.row_factory
+        memory.set_trace_callback(self.trace_callback)
+        for alias, path in self.attached.items():
+            memory.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        for key, registration in self.functions.items():
+            _create_function(memory, *key, *registration)
+        return memory
+
+    def refresh_memory_copy(self) -> None:
+        """reloads the in memory copy from the file now, reads keep using the old copy until the new one is swapped in"""
+        if self.memory_conn is None:
+            raise FortifySQLError("refresh_memory_copy() called on a database without in_memory_copy")
+        writes = self.writes # writes started after this may not be in the copy
+        memory = self._load_memory_copy()
+        with self.__swap_lock:
+            old, self.memory_conn = self.memory_conn, memory
+            self.memory_writes = writes
+            self.__retire([old])
+
+    def _reload_statistics(self) -> None:
+        """makes the read connections and the in memory copy use the statistics of a new ANALYZE, 
+        other connections only load sqlite_stat1 when they're opened so the read connections are reopened. 
+        The old ones close once the queries and cursors still using them are done"""
+        if self.memory_conn is not None:
+            self.refresh_memory_copy()
+        if self.read_conns != []:
+            read_conns = [self._connect_read_only() for _ in self.read_conns]
+            with self.__swap_lock:
+                old, self.read_conns = self.read_conns, read_conns
+                self.__retire(old)
+
+    def _route(self, statement_type: str) -> sqlite3.Connection:
+        """_read_connection() that marks a read connection or the in memory copy as in use until _release(), 
+        so it isn't closed under the query if it's swapped out"""
+        with self.__swap_lock:
+            conn = self._read_connection(statement_type)
+            if conn is not self.conn:
+                self.__in_use[conn] = self.__in_use.get(conn, 0) + 1
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        """ends a use of a connection from _route(), closing it if it has been swapped out and this was the last use"""
+        if conn is self.conn:
+            return
+        with self.__swap_lock:
+            uses = self.__in_use.pop(conn) - 1
+            if uses > 0:
+                self.__in_use[conn] = uses
+            elif conn in self.__retired:
+                self.__retired.discard(conn)
+                conn.close()
+
+    def __retire(self, conns: List[sqlite3.Connection]) -> None:
+        """closes swapped out connections, or marks them to be closed by _release() if they're in use. Needs __swap_lock"""
+        for conn in conns:
+            if conn in self.__in_use:
+                self.__retired.add(conn)
+            else:
+                conn.close()
+
+    def function(self, func: Callable | None = None, name: str = "", deterministic: bool = True, num_args: int | None = None):
+        """Registers a python function as an SQL function on every connection of the database (read connections and
+        the in memory copy too), used as a decorator: @db.function or @db.function(deterministic=False). \n
+        The function gets a .sql expression builder for the ORM like the ones in sql_functions, 
+        e.g. table.get(slugify.sql(table.title)). Functions aren't available in Select.parallel_map() workers
+
+        Args:
+            func (Callable | None, optional): function to register, None when used as @db.function(...). Defaults to None.
+            name (str, optional): SQL name, defaults to the function's name. Defaults to "".
+            deterministic (bool, optional): same arguments always give the same result, lets SQLite use it in indexes. Defaults to True.
+            num_args (int | None, optional): number of arguments, -1 for any, worked out from the function if None. Defaults to None.
+
+        Raises:
+            FortifySQLError: if name isn't a valid SQL name
+
+        Returns:
+            Callable: the function with a .sql builder, or a decorator if func is None
+        """
+        def register(func: Callable) -> Callable:
+            count = num_args if num_args is not None else _arg_count(func)
+            return self.__register_function(func, name or func.__name__, count, "function", deterministic)
+        return register if func is None else register(func)
+
+    def aggregate(self, cls: type | None = None, name: str = "", num_args: int | None = None):
+        """Registers a class as an SQL aggregate function, it needs a step(*values) method called for each row 
+        and a finalize() method returning the result, used as a decorator: @db.aggregate or @db.aggregate(name="...") 
+
+        Args:
+            cls (type | None, optional): aggregate class, None when used as @db.aggregate(...). Defaults to None.
+            name (str, optional): SQL name, defaults to the class name. Defaults to "".
+            num_args (int | None, optional): number of arguments, -1 for any, worked out from step() if None. Defaults to None.
+
+        Raises:
+            FortifySQLError: if name isn't a valid SQL name
+
+        Returns:
+            type: the class with a .sql builder, or a decorator if cls is None
+        """
+        def register(cls: type) -> type:
+            count = num_args if num_args is not None else _arg_count(cls.step, method=True)
+            return self.__register_function(cls, name or cls.__name__, count, "aggregate")
+        return register if cls is None else register(cls)
+
+    def window_function(self, cls: type | None = None, name: str = "", num_args: int | None = None):
+        """Registers a class as an SQL aggregate window function, it needs step(*values), inverse(*values) (removes a row 
+        that left the window), value() (the current result) and finalize() methods. Use the builder with over=, 
+        e.g. moving_avg.sql(table.price, over="ORDER BY day ROWS 6 PRECEDING")
+
+        Args:
+            cls (type | None, optional): window function class, None when used as @db.window_function(...). Defaults to None.
+            name (str, optional): SQL name, defaults to the class name. Defaults to "".
+            num_args (int | None, optional): number of arguments, -1 for any, worked out from step() if None. Defaults to None.
+
+        Raises:
+            FortifySQLError: if name isn't a valid SQL name or SQLite is older than 3.25
+
+        Returns:
+            type: the class with a .sql builder, or a decorator if cls is None
+        """
+        if not hasattr(self.conn, "create_window_function"):
+            raise FortifySQLError("window_function() needs SQLite 3.25 or newer")
+        def register(cls: type) -> type:
+            count = num_args if num_args is not None else _arg_count(cls.step, method=True)
+            return self.__register_function(cls, name or cls.__name__, count, "window")
+        return register if cls is None else register(cls)
+
+    def __register_function(self, func, name: str, num_args: int, kind: str, deterministic: bool = False):
+        """registers a function on every connection and remembers it for connections opened later"""
+        if not name.isidentifier():
+            raise FortifySQLError(f"can't register a function called {name}, it isn't a valid SQL name")
+        with self.lock:
+            self.functions[(name, num_args)] = (kind, func, deterministic)
+            for conn in self._connections():
+                _create_function(conn, name, num_args, kind, func, deterministic)
+        builder = function_builder(name)
+        try:
+            func.sql = builder
+        except (AttributeError, TypeError): # builtins like math.sqrt don't take attributes, so return a wrapper with the builder
+            func = wraps(func)(lambda *args, _func=func: _func(*args))
+            func.sql = builder
+        return func
 
     def delete_checking(self, enable: bool = True) -> None:
         """Delete checking creates a temporary copy of a table before executing a delete statement, it will check that the table still exists after the delete statement \n
@@ -235,6 +645,406 @@ class Database:
             if syntax in self.banned_syntax:
                 self.banned_syntax.remove(syntax)
 
+    def scan_guard(self, min_rows: int | None = 10000, action: str = "error", allow: Iterable[str] = ()) -> None:
+        """Performance rule checked with the security rules, statements are ran through EXPLAIN QUERY PLAN (cached per statement)
+        and any that SCAN a whole table with at least min_rows rows are rejected with FullScanError or warned about with FullScanWarning. \n
+        Table sizes are estimated from max(rowid), or sqlite_stat1 for WITHOUT ROWID tables. Statements that need a full scan 
+        can be allowed with allow_full_scan()
+
+        Args:
+            min_rows (int | None, optional): smallest table a full scan is caught on, None turns the guard off. Defaults to 10000.
+            action (str, optional): "error" or "warn". Defaults to "error".
+            allow (Iterable[str], optional): statements that are allowed to scan. Defaults to ().
+
+        Raises:
+            FortifySQLError: if action isn't "error" or "warn"
+        """
+        if action not in ("error", "warn"):
+            raise FortifySQLError(f"""scan_guard() action must be "error" or "warn", got {action}""")
+        self.scan_min_rows = min_rows
+        self.scan_action = action
+        for request in allow:
+            self.allow_full_scan(request)
+
+    def allow_full_scan(self, request: str) -> None:
+        """lets a statement do full table scans when the scan guard is on, e.g. a nightly report
+
+        Args:
+            request (str): the exact SQL of the statement, for ORM selects use str(select)
+        """
+        self.scan_allowlist.add(str(request))
+
+    def _forget_plans(self) -> None:
+        """clears the scan guard's cached query plans, called when indexes or statistics change"""
+        self.__scan_plans.clear()
+
+    def __check_full_scans(self, request: str, parameters) -> None:
+        """the scan guard, see scan_guard(). Plans are cached by the statement's template so values written into the SQL 
+        share one plan, the least recently used are forgotten once there are _SCAN_PLAN_CACHE. 
+        Every plan is forgotten when the schema_version of a schema changes, e.g. an index was created or dropped"""
+        schema = self._schema_versions()
+        if schema != self.__scan_plans_schema:
+            self.__scan_plans.clear()
+            self.__scan_plans_schema = schema
+        template = _template(request)
+        if template in self.__scan_plans:
+            self.__scan_plans.move_to_end(template)
+        else:
+            try:
+                scans = self._full_scans(request, parameters)
+            except sqlite3.ProgrammingError: # checked without its parameters (e.g. the write behind writer), can't be planned
+                return
+            self.__scan_plans[template] = scans
+            if len(self.__scan_plans) > _SCAN_PLAN_CACHE:
+                self.__scan_plans.popitem(last=False)
+        for schema, table in self.__scan_plans[template]:
+            rows = self._estimate_rows(schema, table)
+            if rows < self.scan_min_rows:
+                continue
+            message = f"{request} scans every row of {table} (about {rows} rows), add an index or use allow_full_scan()"
+            if self.scan_action == "error":
+                raise FullScanError(message)
+            warnings.warn(message, FullScanWarning, stacklevel=4)
+
+    def _schema_versions(self) -> Tuple[int, ...]:
+        """PRAGMA schema_version of main and every attached database, changes whenever a table or index is created, dropped or altered"""
+        return tuple(self.conn.execute(f"PRAGMA {name}.schema_version").fetchone()[0] for name in ["main", *self.attached])
+
+    def _query_plan(self, request: str, parameters) -> List[str]:
+        """the detail of every line of EXPLAIN QUERY PLAN for a statement, ran on the main connection"""
+        # SQLite doesn't prepare EXPLAIN again when the schema changes, so the version keeps sqlite3's statement cache from reusing an old plan
+        explain = f"/* schema {'.'.join(map(str, self._schema_versions()))} */ EXPLAIN QUERY PLAN {request}"
+        return [row[3] for row in self.conn.execute(explain, parameters).fetchall()]
+
+    def _full_scans(self, request: str, parameters) -> List[Tuple[str, str]]:
+        """the (schema, table) of every table a statement's query plan scans fully"""
+        aliases = {}
+        def find_aliases(tokens):
+            for token in tokens.get_sublists():
+                if isinstance(token, sqlparse.sql.Identifier) and token.get_alias():
+                    aliases[token.get_alias()] = (token.get_parent_name(), token.get_real_name())
+                find_aliases(token)
+        find_aliases(sqlparse.parse(request)[0])
+
+        schemas = ["main", *self.attached]
+        scans = []
+        for detail in self._query_plan(request, parameters):
+            name = _scanned_table(detail)
+            if name is None:
+                continue
+            schema, table = aliases.get(name, (None, name))
+            for candidate in ([schema] if schema else schemas):
+                found = self.conn.execute(f"SELECT 1 FROM {candidate}.sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+                if found is not None: # CTEs, subqueries and temp tables aren't in sqlite_master
+                    scans.append((candidate, table))
+                    break
+        return scans
+
+    def _estimate_rows(self, schema: str, table: str) -> int:
+        """roughly how many rows a table has without counting them"""
+        try:
+            return self.conn.execute(f"SELECT coalesce(max(rowid), 0) FROM {schema}.{table}").fetchone()[0]
+        except sqlite3.OperationalError: # WITHOUT ROWID
+            try:
+                stat = self.conn.execute(f"SELECT stat FROM {schema}.sqlite_stat1 WHERE tbl=?", (table,)).fetchone()
+            except sqlite3.OperationalError: # never analyzed
+                return 0
+            return int(stat[0].split()[0]) if stat is not None else 0
+
+    def track_workload(self, enable: bool = True) -> None:
+        """Starts or stops recording the ORM selects ran on the database (.all(), .first() and .limit()),
+        how often each statement runs and how long it takes are kept in db.workload and used by advise_indexes(). 
+        Statements are grouped by their template, values written into the SQL (e.g. by .filter(id=5)) count as ?, 
+        and only the 1000 most recently ran templates are kept. Starting again clears what was recorded
+
+        Args:
+            enable (bool, optional): True to record selects, False to stop and forget them. Defaults to True.
+        """
+        self.workload = OrderedDict() if enable else None
+
+    def _record_select(self, select, parameters: tuple, elapsed: float) -> None:
+        """adds an execution of an ORM select to the workload"""
+        template = _template(select.statement)
+        with self.lock:
+            entry = self.workload.get(template)
+            if entry is None:
+                entry = self.workload[template] = {
+                    "statement": select.statement, "executions": 0, "time": 0.0, "parameters": parameters, 
+                    "cols": list(getattr(select, "cols", ())), "tables": [select.table, *(table for table, _ in getattr(select, "joins", []))]}
+                if len(self.workload) > _WORKLOAD_STATEMENTS:
+                    self.workload.popitem(last=False)
+            else:
+                self.workload.move_to_end(template)
+            entry["executions"] += 1
+            entry["time"] += elapsed
+
+    def advise_indexes(self, apply: bool = False, min_executions: int = 1, max_covering_columns: int = 3) -> List[dict]:
+        """Recommends indexes for the selects recorded with track_workload(). Columns in WHERE (equalities first, then a range), 
+        JOIN ON and ORDER BY are combined into a composite index for every table the query plan (EXPLAIN QUERY PLAN) scans fully
+        or sorts with a temporary b-tree, selected columns are added to make it covering when there's only a few. 
+        The benefit is estimated in rows read per run from the table size and sqlite_stat1 (or a sample of the column). \n
+        Call it without apply first to look at the report (a dry run), then with apply=True to create the indexes
+
+        Args:
+            apply (bool, optional): create the recommended indexes and ANALYZE their tables. Defaults to False.
+            min_executions (int, optional): selects ran fewer times than this are ignored. Defaults to 1.
+            max_covering_columns (int, optional): most selected columns added to make an index covering. Defaults to 3.
+
+        Raises:
+            FortifySQLError: if workload tracking isn't on
+            SecurityError: if apply is True and CREATE statements are banned
+
+        Returns:
+            List[dict]: one dict per index, biggest benefit first, with the keys: table, columns, covering, reason, sql 
+                (the CREATE INDEX statement), statements (templates the index helps), executions, total_time, avg_time, rows (table size), 
+                estimated_rows_saved (per run) and benefit (rows saved over every recorded run)
+        """
+        if self.workload is None:
+            raise FortifySQLError("advise_indexes() needs track_workload() to be on")
+        report = advisor.advise(self, min_executions, max_covering_columns)
+        if apply:
+            for item in report:
+                self.query(item["sql"])
+            for table in dict.fromkeys(item["table"] for item in report):
+                self.query(f"ANALYZE {table}")
+            self._forget_plans()
+        return report
+
+    def retry_policy(self, busy_timeout: float = 5.0, max_retries: int = 0, backoff: float = 0.05, 
+                     max_backoff: float = 2.0, max_elapsed: float = 30.0) -> None:
+        """Sets how the database waits when another connection has it locked (SQLITE_BUSY / "database is locked") \n
+        SQLite first waits up to busy_timeout seconds itself, then the statement is retried up to max_retries times 
+        with exponential backoff and full jitter (a random wait between 0 and backoff * 2^attempt, at most max_backoff), 
+        until max_elapsed seconds have passed. Retries and time spent waiting are counted in db.busy_stats. 
+        The DatabaseBusyError raised when it gives up isn't caught by error_catch(). \n
+        Write statements always start with BEGIN IMMEDIATE so the write lock is taken before anything is read
+
+        Args:
+            busy_timeout (float, optional): seconds SQLite waits for a lock before reporting busy. Defaults to 5.0.
+            max_retries (int, optional): times a busy statement is retried, 0 raises straight away. Defaults to 0.
+            backoff (float, optional): seconds of backoff for the first retry. Defaults to 0.05.
+            max_backoff (float, optional): longest backoff between retries in seconds. Defaults to 2.0.
+            max_elapsed (float, optional): seconds after which no more retries are made. Defaults to 30.0.
+        """
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+        self.busy_stats = {"retries": 0, "waited": 0.0, "failures": 0}
+        for conn in self._connections():
+            conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    def _retry(self, func: Callable, *args) -> Any:
+        """calls func, retrying it with the retry policy while the database is busy
+
+        Raises:
+            DatabaseBusyError: if the database is still busy after the retries
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or self.max_retries == 0:
+                    raise e
+                elapsed = time.monotonic() - start
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if attempt >= self.max_retries or elapsed + delay > self.max_elapsed:
+                    self.busy_stats["failures"] += 1
+                    raise DatabaseBusyError(f"database {self.path} still busy after {attempt} retries in {elapsed:.2f}s: {e}") from e
+                time.sleep(delay)
+                attempt += 1
+                self.busy_stats["retries"] += 1
+                self.busy_stats["waited"] += delay
+
+    @property
+    def transaction_depth(self) -> int:
+        """how many transaction() blocks the calling thread has open, another thread's transaction doesn't count"""
+        return getattr(self.__local, "transaction_depth", 0)
+
+    @transaction_depth.setter
+    def transaction_depth(self, depth: int) -> None:
+        self.__local.transaction_depth = depth
+
+    def _commit(self) -> None:
+        """commits unless a transaction() is open"""
+        if self.transaction_depth == 0:
+            self._retry(self.conn.commit)
+
+    def _write(self, func: Callable, *args) -> Any:
+        """runs func in a write transaction started with BEGIN IMMEDIATE, joins the current transaction() if there is one
+
+        Raises:
+            FortifySQLError: if a transaction was opened on db.conn outside of transaction()
+        """
+        self.writes += 1
+        if self.transaction_depth > 0:
+            return func(*args)
+        self.__check_no_foreign_transaction()
+        self._retry(self.conn.execute, "BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+            self._retry(self.conn.commit)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return result
+
+    def __check_no_foreign_transaction(self) -> None:
+        """raises if db.conn has a transaction that wasn't started by transaction() or a write, e.g. an implicit one 
+        from db.conn.execute("INSERT ..."), nothing would commit the writes joining it"""
+        if self.conn.in_transaction:
+            raise FortifySQLError(f"a transaction was opened on the connection to {self.path} outside of transaction(), "
+                                  "commit or roll it back with db.conn first")
+
+    @contextmanager
+    def transaction(self):
+        """Runs every query in the with block in one write transaction, started with BEGIN IMMEDIATE. 
+        Commits at the end of the block or rolls back if there was an error, nested transactions join the outer one \n
+        e.g: with db.transaction(): ...
+
+        Raises:
+            FortifySQLError: if a transaction was opened on db.conn outside of transaction()
+        """
+        with self.lock:
+            if self.transaction_depth > 0:
+                self.transaction_depth += 1
+                try:
+                    yield self
+                finally:
+                    self.transaction_depth -= 1
+                return
+            self.writes += 1
+            self.__check_no_foreign_transaction()
+            self._retry(self.conn.execute, "BEGIN IMMEDIATE")
+            self.transaction_depth = 1
+            try:
+                yield self
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self._retry(self.conn.commit)
+            finally:
+                self.transaction_depth = 0
+
+    def write_behind(self, enable: bool = True, max_queue: int = 10000, batch_size: int = 1000, 
+                     flush_interval: float = 0.05, put_timeout: float | None = None) -> WriteBehind | None:
+        """Enables or disables the write behind writer, when enabled Table.append() queues rows and returns a Future,
+        a background thread writes pending rows for the same table and columns with one executemany per batch in one transaction. \n
+        The batch is written once batch_size rows are waiting or the oldest has waited flush_interval seconds, 
+        use db.writer.flush() to wait until everything queued is committed
+
+        Args:
+            enable (bool, optional): True to start the writer, False to write everything queued and stop it. Defaults to True.
+            max_queue (int, optional): most rows that can be waiting, append() blocks when the queue is full. Defaults to 10000.
+            batch_size (int, optional): rows waiting that cause a write. Defaults to 1000.
+            flush_interval (float, optional): most seconds a row waits before being written. Defaults to 0.05.
+            put_timeout (float | None, optional): seconds append() blocks on a full queue before raising, None waits forever. Defaults to None.
+
+        Returns:
+            WriteBehind | None: the writer, None if disabled
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if enable:
+            self.writer = WriteBehind(self, max_queue, batch_size, flush_interval, put_timeout)
+        return self.writer
+
+    def attach(self, path: str, alias: str) -> "AttachedDatabase":
+        """Attaches another database file to the connection so its tables can be used in queries and ORM selects,
+        e.g. db.attach("archive.db", "archive") then db.archive.events, JOINs and UNIONs across the files run inside SQLite. \n
+        The ATTACH goes through the same security rules as query() (ban it with add_banned_statement("ATTACH")),
+        read connections and the in memory copy attach the file too
+
+        Args:
+            path (str): path to the database file
+            alias (str): schema name the file is attached as, also the attribute its tables are on
+
+        Raises:
+            FortifySQLError: when the database doesn't exist
+            FortifySQLError: if alias isn't a valid name or is already used
+            FortifySQLError: if called inside a transaction()
+            SecurityError: if the ATTACH breaks a security rule
+
+        Returns:
+            AttachedDatabase: the attached database, its tables are attributes like on Database
+        """
+        if not os.path.isfile(path):
+            raise FortifySQLError(f"SQL error - Database does not exist on path: {path}.")
+        if not alias.isidentifier() or alias.lower() in ("main", "temp") or hasattr(self, alias):
+            raise FortifySQLError(f"can't attach a database as {alias}, the name isn't valid or is already used")
+        request = f"ATTACH DATABASE ? AS {alias}"
+        with self.lock:
+            if self.transaction_depth > 0:
+                raise FortifySQLError("attach() can't be called inside a transaction()")
+            self._check_request(request, (path,))
+            self._commit()
+            self._retry(self.conn.execute, request, (path,))
+            self.attached[alias] = path
+            for conn in self._connections()[1:]:
+                conn.execute(request, (path,))
+            attached = AttachedDatabase(self, alias, path)
+            setattr(self, alias, attached)
+        return attached
+
+    def detach(self, alias: str) -> None:
+        """Detaches a database attached with attach(), from every connection
+
+        Args:
+            alias (str): name the database was attached as
+
+        Raises:
+            FortifySQLError: if nothing is attached as alias
+            FortifySQLError: if called inside a transaction()
+            SecurityError: if the DETACH breaks a security rule
+        """
+        if alias not in self.attached:
+            raise FortifySQLError(f"no database is attached as {alias}")
+        request = f"DETACH DATABASE {alias}"
+        with self.lock:
+            if self.transaction_depth > 0:
+                raise FortifySQLError("detach() can't be called inside a transaction()")
+            self._check_request(request)
+            self._commit()
+            del self.attached[alias]
+            for conn in self._connections():
+                conn.execute(request)
+            delattr(self, alias)
+
+    def maintenance(self, enable: bool = True, interval: float = 60.0, idle: float = 1.0, budget: float = 0.1,
+                    analysis_limit: int = 400, analyze_interval: float = 3600.0, vacuum_pages: int = 100,
+                    truncate_wal_frames: int = 1000) -> Maintenance | None:
+        """Enables or disables background maintenance, every interval seconds once no query has ran for idle seconds a thread runs 
+        PRAGMA optimize, ANALYZE (every analyze_interval seconds, limited with analysis_limit), incremental_vacuum 
+        (if auto_vacuum = INCREMENTAL) and a WAL checkpoint (PASSIVE, TRUNCATE once the WAL is big, if in WAL mode). \n
+        A run holds the connection for at most budget seconds, statements still running then are interrupted, 
+        so foreground queries never wait longer than that. Stats of the last run are in db.maintainer.stats 
+        and db.maintainer.run() runs it straight away
+
+        Args:
+            enable (bool, optional): True to start maintenance, False to stop it. Defaults to True.
+            interval (float, optional): seconds between maintenance runs. Defaults to 60.0.
+            idle (float, optional): seconds without queries before the database counts as idle. Defaults to 1.0.
+            budget (float, optional): most seconds a run can hold the connection. Defaults to 0.1.
+            analysis_limit (int, optional): rows ANALYZE looks at per index (PRAGMA analysis_limit). Defaults to 400.
+            analyze_interval (float, optional): seconds between full ANALYZE runs. Defaults to 3600.0.
+            vacuum_pages (int, optional): free pages returned to the OS per run. Defaults to 100.
+            truncate_wal_frames (int, optional): WAL size in frames after which the WAL file is truncated. Defaults to 1000.
+
+        Returns:
+            Maintenance | None: the maintenance scheduler, None if disabled
+        """
+        if self.maintainer is not None:
+            self.maintainer.close()
+            self.maintainer = None
+        if enable:
+            self.maintainer = Maintenance(self, interval, idle, budget, analysis_limit, analyze_interval, vacuum_pages, truncate_wal_frames)
+        return self.maintainer
+
     def backup(self, path: str = "", extension: str = "db") -> str:
         """Creates a backup of the database as path/time.extension ("/time.db" by default) where time us the time of the backup
 
@@ -246,6 +1056,8 @@ class Database:
             str: path it was saved to
         """
         path = path + "/" + str(time.asctime().replace(":", "-") + "." + extension)
+        if self.writer is not None:
+            self.writer.flush()
         with open(self.path, "rb") as src_file:
             with open(path, "wb") as dst_file:
                 dst_file.write(src_file.read())
@@ -273,36 +1085,123 @@ class Database:
                 from_id = token_list.token_index(token)
                 table = token_list.token_next(from_id)[1].value
 
-        cur = self.conn.cursor()
-        cur.execute(f"SELECT * FROM {table}")
-        if cur.fetchall() != []:
-            cur.close()
-            self.conn.commit()
+        with self.lock: # checked on the main connection
             cur = self.conn.cursor()
-            key = random.randint(0, 100)
-            temp_table = f"check{key}"
-            cur.execute(f"CREATE TEMP TABLE {temp_table} AS SELECT * FROM {table}")
-            cur.execute(f"INSERT INTO {temp_table} SELECT * FROM {table}")
-            query = request.replace(table, temp_table)
-            cur.execute(query, parameters)
-            cur.execute(f"SELECT * FROM {temp_table}")
-            if cur.fetchall == []:
-                cur.execute(f"DROP TABLE {temp_table}")
-                self.conn.commit()
+            cur.execute(f"SELECT * FROM {table}")
+            if cur.fetchall() != []:
                 cur.close()
-                return True
+                self._commit()
+                cur = self.conn.cursor()
+                key = random.randint(0, 100)
+                temp_table = f"check{key}"
+                cur.execute(f"CREATE TEMP TABLE {temp_table} AS SELECT * FROM {table}")
+                cur.execute(f"INSERT INTO {temp_table} SELECT * FROM {table}")
+                query = request.replace(table, temp_table)
+                cur.execute(query, parameters)
+                cur.execute(f"SELECT * FROM {temp_table}")
+                if cur.fetchall == []:
+                    cur.execute(f"DROP TABLE {temp_table}")
+                    self._commit()
+                    cur.close()
+                    return True
+                else:
+                    cur.execute(f"DROP TABLE {temp_table}")
+                    self._commit()
+                    cur.close()
+                    return False
             else:
-                cur.execute(f"DROP TABLE {temp_table}")
-                self.conn.commit()
+                self._commit()
                 cur.close()
                 return False
-        else:
-            self.conn.commit()
-            cur.close()
-            return False
+
+    def _check_request(self, request: str, parameters=()) -> str:
+        """runs the security rules of the database against a request, shared by every method that executes SQL
+
+        Args:
+            request (str): SQL request to check
+            parameters (tuple, optional): request parameters. Defaults to ()
+
+        Raises:
+            SecurityError: if more than one statement is provided e.g: SELECT * FROM table; SELECT * FROM table2
+            SecurityError: if a DROP statement is provided and they're banned
+            SecurityError: if a banned statement was provided
+            SecurityError: if a banned syntax was provided
+            SecurityError: if a dangerous DELETE was provided
+            FullScanError: if the scan guard is on and the statement scans a large table, see scan_guard()
+
+        Returns:
+            str: the statement type e.g. SELECT
+        """
+        self.last_activity = time.monotonic()
+        parsed = sqlparse.parse(request)
+        if not len(parsed) == 1:
+            raise SecurityError("Multiple statements not allowed in a single query")
+
+        if (not self.allow_dropping) and is_drop_query(request):
+            raise SecurityError(f"Dropping is disabled on this database")
+
+        statement_type = parsed[0].get_type().upper()
+        if statement_type == "UNKNOWN": # sqlparse doesn't know ATTACH, DETACH, PRAGMA etc. so use the first keyword
+            first = parsed[0].token_first(skip_cm=True)
+            statement_type = first.normalized.upper() if first is not None else statement_type
+
+        if self.banned_statements != []:
+            if statement_type in self.banned_statements:
+                raise SecurityError(f"Attempted to execute banned statement: {request}")
+
+        if self.banned_syntax != []:
+            for banned in self.banned_syntax:
+                if banned in request:
+                    raise SecurityError(f"Attempted to execute banned syntax: {request}")
+
+        if self.is_dangerous_delete(request, parameters):
+            raise SecurityError(f"Attempted to execute dangerous statement: {request}")
+
+        if self.scan_min_rows is not None and statement_type in _SCAN_CHECKED and request not in self.scan_allowlist:
+            with self.lock: # planned on the main connection
+                self.__check_full_scans(request, parameters)
+        return statement_type
+
+    def execute(self, request: str, parameters: tuple=(), timeout: float | None = None) -> "StreamingCursor":
+        """Executes a single statement and returns the open cursor instead of the data, 
+        used to stream large results with cursor.fetchmany() without loading them all into memory. \n
+        The same security rules as query() are applied, the caller is responsible for closing the cursor. 
+        The timeout covers fetching too, it's checked until the cursor is closed or every row has been fetched
+
+        Args:
+            request (str): SQL request to execute
+            parameters (tuple, optional): paramaters to insert into request. Defaults to ().
+            timeout (float | None, optional): seconds the statement can run for, None uses query_timeout(). Defaults to None.
+
+        Raises:
+            QueryTimeoutError: if the statement ran for longer than the timeout, also raised while fetching
+            QueryCancelledError: if the statement was interrupted with cancel(), also raised while fetching
+
+        Returns:
+            StreamingCursor: cursor the request was executed on
+        """
+        request = str(request)
+        conn = self._route(self._check_request(request, parameters))
+        if conn is self.conn:
+            with self.lock:
+                return self.__open_cursor(conn, request, parameters, timeout)
+        return self.__open_cursor(conn, request, parameters, timeout) # read connections don't need the lock
+
+    def _execute_main(self, request: str, parameters: tuple = (), timeout: float | None = None) -> "StreamingCursor":
+        """execute() on the main connection whatever the statement is, for reads of TEMP tables only it can see"""
+        request = str(request)
+        with self.lock:
+            self._check_request(request, parameters)
+            return self.__open_cursor(self.conn, request, parameters, timeout)
+
+    def __open_cursor(self, conn: sqlite3.Connection, request: str, parameters: tuple, timeout: float | None) -> "StreamingCursor":
+        """executes a request for execute(), the deadline stays on the connection until the cursor is done"""
+        cur = StreamingCursor(self, conn, conn.cursor(), self._start_deadline(conn, timeout))
+        cur._guard(self._retry, cur.cursor.execute, request, parameters)
+        return cur
 
     # Excecutes a single query on the database
-    def query(self, request: str, parameters: tuple=(), save_data=True) -> List[Tuple[Any]] | None:
+    def query(self, request: str, parameters: tuple=(), save_data=True, timeout: float | None = None) -> List[Tuple[Any]] | None:
         """Handles querying a database, includes paramaterisation for safe user inputing. \n
         SECURITY NOTE: this allows a single statement to be excecuted no more
 
@@ -310,6 +1209,7 @@ class Database:
             request (str): SQL request to execute
             parameters (tuple, optional): paramaters to insert into request. Defaults to ().
             save_data (bool, optional): can be used to ignore data returned by SQL. Defaults to True.
+            timeout (float | None, optional): seconds the statement can run for, None uses query_timeout(). Defaults to None.
 
         Raises:
             SecurityError: if more than one statement is provided e.g: SELECT * FROM table; SELECT * FROM table2
@@ -317,42 +1217,40 @@ class Database:
             SecurityError: if a banned statement was provided
             SecurityError: if a banned syntax was provided
             SecurityError: if a dangerous DELETE was provided
+            QueryTimeoutError: if the statement ran for longer than the timeout
+            QueryCancelledError: if the statement was interrupted with cancel()
+            ResultTooLargeError: if the result is over the result budget and the policy is "error", see result_budget()
 
         Returns:
-            List[Tuple[Any]] | None: None if no data was returned by SQL, returns a table if not
+            List[Tuple[Any]] | None: None if no data was returned by SQL, returns a table if not 
+                (a SpilledResult if it's over the result budget)
         """
         try:
-            with self.conn: \
             request = str(request)
-            parsed = sqlparse.parse(request)
-            if not len(parsed) == 1:
-                raise SecurityError("Multiple statements not allowed in a single query")
-
-            if (not self.allow_dropping) and is_drop_query(request):
-                raise SecurityError(f"Dropping is disabled on this database")
-
-            if self.banned_statements != []:
-                if parsed[0].get_type().upper() in self.banned_statements:
-                    raise SecurityError(f"Attempted to execute banned statement: {request}")
-
-            if self.banned_syntax != []:
-                for banned in self.banned_syntax:
-                    if banned in request:
-                        raise SecurityError(f"Attempted to execute banned syntax: {request}")
-
-            if self.is_dangerous_delete(request, parameters):
-                raise SecurityError(f"Attempted to execute dangerous statement: {request}")
-
-            self.cur = self.conn.cursor()
-            self.cur.execute(request, parameters)
-            data = self.cur.fetchall()
-            self.conn.commit()
-            self.cur.close()
-            self.cur = None
+            statement_type = self._check_request(request, parameters)
+            conn = self._route(statement_type)
+            if conn is not self.conn: # read connections don't need the lock, so they aren't held up by writes
+                try:
+                    with self._deadline(conn, timeout):
+                        data = self._retry(self.__fetch, request, parameters, conn)
+                finally:
+                    self._release(conn)
+            elif statement_type in _WRITE_STATEMENTS:
+                with self.lock, self._deadline(conn, timeout):
+                    data = self._write(self.__fetch, request, parameters)
+            else:
+                with self.lock:
+                    with self._deadline(conn, timeout):
+                        data = self._retry(self.__fetch, request, parameters)
+                    self._commit()
+                    if statement_type == "ANALYZE": # new statistics can change plans without changing the schema
+                        self._forget_plans()
             if save_data:
                 self.recent_data = data
                 return data
 
+        except DatabaseBusyError: # the retry policy gave up, error_catch() doesn't hide it
+            raise
         except Exception as e:
             if self.error:
                 if self.logging:
@@ -361,6 +1259,70 @@ class Database:
             else:
                 raise e
 
+    def __fetch(self, request: str, parameters: tuple, conn: sqlite3.Connection = None) -> List[Tuple[Any]]:
+        """executes a request on a connection (the main connection by default) and returns all of its data"""
+        cur = (conn or self.conn).cursor()
+        if conn is None:
+            self.cur = cur
+        try:
+            cur.execute(request, parameters)
+            if self.result_max_bytes is None:
+                return cur.fetchall()
+            return self.__fetch_within_budget(request, cur)
+        finally:
+            cur.close()
+            self.cur = None
+
+    def __fetch_within_budget(self, request: str, cur: sqlite3.Cursor) -> List[Tuple[Any]] | SpilledResult:
+        """fetches a result in batches while it's under the result budget, then follows the result policy"""
+        data = []
+        size = 0
+        rows = cur.fetchmany(_BUDGET_BATCH)
+        while rows:
+            for n, row in enumerate(rows):
+                size += row_size(row)
+                if size > self.result_max_bytes:
+                    if self.result_policy == "error":
+                        raise ResultTooLargeError(f"result of {request} is over the budget of {self.result_max_bytes} bytes")
+                    data.extend(rows[:n])
+                    return SpilledResult(data, itertools.chain(rows[n:], cur))
+            data.extend(rows)
+            rows = cur.fetchmany(_BUDGET_BATCH)
+        return data
+
+    def executemany(self, request: str, parameters: Iterable[tuple]) -> int | None:
+        """Executes a single statement once for every set of parameters inside one transaction, 
+        parameters can be any iterable (e.g. a generator) so rows are streamed into SQLite. \n
+        The security rules are only checked once for the statement
+
+        Args:
+            request (str): SQL request to execute
+            parameters (Iterable[tuple]): sets of paramaters to insert into request.
+
+        Raises:
+            SecurityError: if the statement breaks a security rule, see query()
+
+        Returns:
+            int | None: number of rows changed, None if an error was caught by error_catch()
+        """
+        try:
+            request = str(request)
+            parameters = iter(parameters)
+            first = next(parameters, None)
+            if first is None:
+                return 0
+            with self.lock:
+                self._check_request(request, first)
+                return self._write(self.conn.executemany, request, itertools.chain((first,), parameters)).rowcount
+        except DatabaseBusyError: # the retry policy gave up, error_catch() doesn't hide it
+            raise
+        except Exception as e:
+            if self.error:
+                if self.logging:
+                    print(f"SQL DATABASE ERROR, database: {self.path}, error: {e}")
+            else:
+                raise e
+
     # Excecutes multiple queries on the database
     def multi_query(self, request: str, parameters: tuple=(), save_data=True) -> List[Tuple[Any]]:
         """Handles querying a database, includes paramaterisation for safe user inputing. \n
@@ -385,6 +1347,8 @@ class Database:
             for statement in statements:
                 self.query(statement, parameters, save_data)
             return self.recent_data
+        except DatabaseBusyError: # the retry policy gave up, error_catch() doesn't hide it
+            raise
         except Exception as e:
             if self.error:
                 if self.logging:
@@ -392,6 +1356,265 @@ class Database:
             else:
                 raise e
             
+class StreamingCursor:
+    """The cursor returned by Database.execute(), works like a sqlite3.Cursor (fetchone, fetchmany, fetchall, iterating, 
+    description, close) while keeping the statement's deadline on the connection until it's closed or every row is fetched"""
+    def __init__(self, db: Database, conn: sqlite3.Connection, cursor: sqlite3.Cursor, deadline: float | None) -> None:
+        self.db = db
+        self.conn = conn
+        self.cursor = cursor
+        self.deadline = deadline
+        self.done = False
+
+    def _guard(self, func: Callable, *args) -> Any:
+        """calls func, closing the cursor if it fails and turning interrupts into QueryTimeoutError or QueryCancelledError"""
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            self.close()
+            error = self.db._interrupted(e, self.deadline)
+            if error is e:
+                raise e
+            raise error from e
+        except BaseException:
+            self.close()
+            raise
+
+    def __finish(self) -> None:
+        """removes the deadline and ends the use of the connection once the statement has no more rows"""
+        if not self.done:
+            self.done = True
+            self.db._end_deadline(self.conn, self.deadline)
+            self.db._release(self.conn)
+
+    def fetchone(self) -> Tuple[Any] | None:
+        row = self._guard(self.cursor.fetchone)
+        if row is None:
+            self.__finish()
+        return row
+
+    def fetchmany(self, size: int | None = None) -> List[Tuple[Any]]:
+        size = self.cursor.arraysize if size is None else size
+        rows = self._guard(self.cursor.fetchmany, size)
+        if len(rows) < size:
+            self.__finish()
+        return rows
+
+    def fetchall(self) -> List[Tuple[Any]]:
+        rows = self._guard(self.cursor.fetchall)
+        self.__finish()
+        return rows
+
+    def __iter__(self) -> Iterator[Tuple[Any]]:
+        return self
+
+    def __next__(self) -> Tuple[Any]:
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int | None:
+        return self.cursor.lastrowid
+
+    def close(self) -> None:
+        """closes the cursor and removes its deadline"""
+        self.__finish()
+        self.cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        if not getattr(self, "done", True):
+            self.__finish()
+
+def _scan_partition(uri: str, statement: str, parameters: tuple, func: Callable, reduce: Callable | None, 
+                    batch_size: int) -> List[Any] | Tuple[bool, Any]:
+    """ran in a worker process by Select.parallel_map(), applies func to one rowid range on its own read only connection
+
+    Returns:
+        List[Any] | Tuple[bool, Any]: the results, or (if the range had rows, reduced result) if reduce is given
+    """
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        conn.execute("PRAGMA query_only = 1")
+        cur = conn.execute(statement, parameters)
+        results = []
+        has_value, reduced = False, None
+        rows = cur.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                value = func(row[1:]) # drop fortify_rowid
+                if reduce is None:
+                    results.append(value)
+                elif has_value:
+                    reduced = reduce(reduced, value)
+                else:
+                    has_value, reduced = True, value
+            rows = cur.fetchmany(batch_size)
+        return results if reduce is None else (has_value, reduced)
+    finally:
+        conn.close()
+
+def _refresh_memory_copy(ref: weakref.ref, watcher: sqlite3.Connection, version: int, stop: threading.Event) -> None:
+    """background thread for Database(in_memory_copy=True), reloads the copy when PRAGMA data_version changes. 
+    Only holds a weak reference to the database so it stops once the database is garbage collected"""
+    try:
+        while True:
+            db = ref()
+            if db is None:
+                return
+            interval = db.refresh_interval
+            del db
+            if stop.wait(interval):
+                return
+            latest = watcher.execute("PRAGMA data_version").fetchone()[0]
+            db = ref()
+            if db is None:
+                return
+            behind = db.memory_writes < db.writes # e.g. a write that was rolled back, the file is the same but reads avoid the copy
+            del db
+            if latest == version and not behind:
+                continue
+            db = ref()
+            if db is None:
+                return
+            try:
+                db.refresh_memory_copy()
+                version = latest
+            except sqlite3.Error:
+                pass # try again next interval
+            del db
+    finally:
+        watcher.close()
+
+def _whole_result_feature(statement: str, aggregates: set, clauses: set = _WHOLE_RESULT_CLAUSES) -> str | None:
+    """finds what makes a select need every row at once (an aggregate or window function, GROUP BY, ORDER BY, LIMIT etc.), 
+    None if rows can be processed in separate ranges. Subqueries aren't checked, they run whole in each range
+
+    Args:
+        statement (str): select statement
+        aggregates (set): names of registered aggregate and window functions, lower case
+        clauses (set, optional): clauses that need every row. Defaults to _WHOLE_RESULT_CLAUSES.
+    """
+    def find(group) -> str | None:
+        for token in group.tokens:
+            if isinstance(token, sqlparse.sql.Parenthesis):
+                continue
+            if token.is_keyword and token.normalized in clauses:
+                return token.normalized
+            if token.is_keyword and token.normalized == "OVER": # older sqlparse doesn't group OVER with its function
+                return "a window function"
+            if isinstance(token, sqlparse.sql.Function):
+                name = (token.get_name() or "").lower()
+                if any(sub.is_group and sub.token_first().normalized == "OVER" for sub in token.tokens):
+                    return f"the window function {name}()"
+                scalar = name in ("min", "max") and len(list(token.get_parameters())) > 1 # min(a, b) isn't an aggregate
+                if (name in _AGGREGATES or name in aggregates) and not scalar:
+                    return f"the aggregate function {name}()"
+            if token.is_group:
+                found = find(token)
+                if found is not None:
+                    return found
+        return None
+    return find(sqlparse.parse(statement)[0])
+
+def _scanned_table(detail: str) -> str | None:
+    """the table (or alias) a line of EXPLAIN QUERY PLAN scans fully, None if it isn't a full scan. 
+    SQLite before 3.36 writes "SCAN TABLE name", newer versions "SCAN name" """
+    words = detail.split()
+    if words[:1] != ["SCAN"] or "VIRTUAL" in words:
+        return None
+    if len(words) > 2 and words[1] == "TABLE":
+        del words[1]
+    return words[1] if len(words) > 1 else None
+
+@lru_cache(maxsize=_SCAN_PLAN_CACHE)
+def _template(request: str) -> str:
+    """the template of a statement, used to group statements that only differ by the values written into them: 
+    number and string literals become ?, lists of ? (e.g. IN (?, ?, ?)) become one ? and whitespace is collapsed"""
+    tokens = []
+    for token in sqlparse.parse(request)[0].flatten():
+        if token.is_whitespace:
+            tokens.append(" ")
+        elif token.ttype in sqlparse.tokens.Literal.Number or token.ttype in sqlparse.tokens.Literal.String.Single:
+            tokens.append("?")
+        else:
+            tokens.append(token.value)
+    template = re.sub(r"\s+", " ", "".join(tokens)).strip()
+    return re.sub(r"\?(\s*,\s*\?)+", "?", template)
+
+def _arg_count(func: Callable, method: bool = False) -> int:
+    """number of positional arguments a function takes (not counting self if method is True), 
+    -1 if it takes *args or its signature can't be read (some C builtins)"""
+    try:
+        parameters = inspect.signature(func).parameters.values()
+    except (ValueError, TypeError):
+        return -1
+    if any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters):
+        return -1
+    count = len([parameter for parameter in parameters if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)])
+    return count - 1 if method else count
+
+def _create_function(conn: sqlite3.Connection, name: str, num_args: int, kind: str, func, deterministic: bool) -> None:
+    """registers a function from Database.functions on a connection"""
+    if kind == "function":
+        conn.create_function(name, num_args, func, deterministic=deterministic)
+    elif kind == "aggregate":
+        conn.create_aggregate(name, num_args, func)
+    else:
+        conn.create_window_function(name, num_args, func)
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    """checks if an error is SQLITE_BUSY or SQLITE_LOCKED"""
+    if getattr(error, "sqlite_errorcode", None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+        return True
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+class AttachedDatabase:
+    """A database file attached with Database.attach(), its tables are attributes and run on the main database connection"""
+    def __init__(self, db: Database, alias: str, path: str) -> None:
+        """A database file attached with Database.attach() \n
+            tables are attributes named after the table, their SQL name is alias.table
+
+        Args:
+            db (Database): database the file is attached to
+            alias (str): schema name the file is attached as
+            path (str): path to the database file
+        """
+        self.db = db
+        self.alias = alias
+        self.path = path
+        self.reload_tables()
+
+    def __str__(self) -> str:
+        return self.alias
+
+    def reload_tables(self) -> None:
+        """reloads the tables of the attached database"""
+        reserved_names = ["db", "alias", "path", "tables", "reload_tables"]
+        self.tables = []
+        with self.db.lock:
+            raw_tables = self.db.conn.execute(f"SELECT name, sql, tbl_name FROM {self.alias}.sqlite_master WHERE type='table'").fetchall()
+        for name, sql, tbl_name in raw_tables:
+            table = Table(self.db, f"{self.alias}.{name}", sql, tbl_name)
+            self.tables.append(table)
+            setattr(self, f"tbl_{name}" if name in reserved_names else name, table)
+
 class Column: # first defined here for typechecking
     name = ...
     dtype = ...
@@ -442,6 +1665,11 @@ class Table:
         query = f"SELECT {args} FROM {self.__name}"
         return self.db.query(query)
         
+    def _pragma(self, pragma: str) -> str:
+        """formats a PRAGMA about the table, tables on attached databases need PRAGMA alias.pragma(table)"""
+        schema, _, name = self.__name.rpartition(".")
+        return f"PRAGMA {schema + '.' if schema else ''}{pragma}({name})"
+
     def __import_columns(self) -> List[Column]:
         """
         imports the columns from the connected Database
@@ -449,7 +1677,7 @@ class Table:
         Returns:
             List[Columns]: a list of columns in a table
         """
-        cursor = self.db.conn.execute(f'PRAGMA table_info({self.__name})')
+        cursor = self.db.conn.execute(self._pragma("table_info"))
         data = cursor.fetchall()
         column_info = [[row[1], row[2]] for row in data]
         column_info = [(column_info[n][0], get_dtype(column_info[n][1])) for n, column in enumerate(column_info)]
@@ -492,11 +1720,97 @@ class Table:
         """
         return Select(self).select().filter(expr, **kw)
     
+    def get_many(self, column: Column | str, keys: Iterable, chunk_size: int = 500, ordered: bool = False,
+                 temp_table_after: int = 50000) -> Iterator[Tuple[Any]]:
+        """fetches every row where column matches one of the keys, i.e: table.get_many(table.id, [4, 2, 7]) \n
+        the keys are split into chunks of chunk_size and one parameterised IN query is ran per chunk,
+        if there are more than temp_table_after keys they are joined against a temporary table instead. 
+        Rows are streamed as they're fetched, duplicate keys are only fetched once
+
+        Args:
+            column (Column | str): column to match the keys against, normally the primary key
+            keys (Iterable): values to look up, converted to the column's datatype (left as they are if it's one get_dtype() doesn't know)
+            chunk_size (int, optional): how many keys are in each IN query. Defaults to 500.
+            ordered (bool, optional): return rows in the same order as the keys. Defaults to False.
+            temp_table_after (int, optional): number of keys after which a temporary table is used. Defaults to 50000.
+
+        Raises:
+            FortifySQLError: if chunk_size is more than SQLite's parameter limit
+            SQLTypeError: if a key can't be converted to the column's datatype
+
+        Returns:
+            Iterator[Tuple[Any]]: matching rows, the arguments are checked straight away and the queries ran as it's iterated
+        """
+        if not 0 < chunk_size <= SQLITE_MAX_VARIABLES:
+            raise FortifySQLError(f"get_many() chunk_size must be between 1 and {SQLITE_MAX_VARIABLES}, got {chunk_size}")
+        if not isinstance(column, Column):
+            column = getattr(self, str(column))
+        keys = list(dict.fromkeys(coerce_many(column.dtype, keys)))
+        if len(keys) > temp_table_after:
+            return self.__get_many_temp_table(column, keys, ordered)
+        return self.__get_many_chunks(column, keys, chunk_size, ordered)
+
+    def __get_many_chunks(self, column: Column, keys: List[Any], chunk_size: int, ordered: bool) -> Iterator[Tuple[Any]]:
+        """used by get_many(), runs one IN query per chunk of keys"""
+        index = next(n for n, col in enumerate(self.columns) if col is column) # Column.__eq__ builds SQL so .index() can't be used
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            sql = f"SELECT * FROM {self.__name} WHERE {column.name} IN ({', '.join('?' for _ in chunk)})"
+            cur = self.db.execute(sql, chunk)
+            try:
+                if not ordered:
+                    yield from cur
+                    continue
+                found = {}
+                for row in cur:
+                    found.setdefault(row[index], []).append(row)
+                for key in chunk:
+                    yield from found.get(key, ())
+            finally:
+                cur.close()
+
+    def __get_many_temp_table(self, column: Column, keys: List[Any], ordered: bool) -> Iterator[Tuple[Any]]:
+        """used by get_many() for large amounts of keys, loads the keys into a temporary table and joins against it"""
+        conn = self.db.conn
+        temp_table = f"keys{random.randint(0, 1_000_000)}"
+        with self.db.lock: # committed straight away so the implicit transaction isn't left open while rows stream
+            conn.execute(f"CREATE TEMP TABLE {temp_table} (position INTEGER PRIMARY KEY, key)")
+        try:
+            with self.db.lock:
+                conn.executemany(f"INSERT INTO {temp_table} (key) VALUES (?)", ((key,) for key in keys))
+                self.db._commit()
+            sql = f"SELECT {self.__name}.* FROM {temp_table} JOIN {self.__name} ON {self.__name}.{column.name} = {temp_table}.key "
+            if ordered:
+                sql += f"ORDER BY {temp_table}.position"
+            cur = self.db._execute_main(sql) # the TEMP table only exists on the main connection, not replicas or the in memory copy
+            try:
+                yield from cur
+            finally:
+                cur.close()
+        finally:
+            with self.db.lock:
+                conn.execute(f"DROP TABLE temp.{temp_table}")
+                conn.commit()
+
     @__edits_table
-    def append(self, **kw) -> None:
-        """appends data to the end of a table
+    def append(self, **kw) -> Future | None:
+        """appends data to the end of a table \n
+        if Database.write_behind() is enabled the row is queued and a Future that resolves once it's committed is returned
         """
         if kw == {}: return 
+        writer = self.db.writer
+        if writer is not None and not any(isinstance(val, Select) for val in kw.values()):
+            for col in kw:
+                getattr(self, col)
+            return writer.append(self, **kw)
+        self._append(**kw)
+
+    def _append(self, **kw) -> None:
+        """appends data to the end of a table straight away, used by append()"""
+        self.db.query(*self._insert_statement(**kw))
+
+    def _insert_statement(self, **kw) -> Tuple[str, tuple]:
+        """builds the INSERT for an append: (sql, parameters)"""
         cols = []
         values = []
         paramaters = ()
@@ -509,12 +1823,70 @@ class Table:
                 paramaters = (*paramaters, val)
                 values.append('?')
             else:  
-                values.append(column.dtype(val))  
+                paramaters = (*paramaters, coerce(column.dtype, val))
+                values.append('?')
         cols = '(' + ', '.join(cols) + ')'
         values = '(' + ', '.join(str(value) for value in values) + ')'
         sql = f"INSERT INTO {self.__name} {cols} VALUES {values}"
-        self.db.query(sql, paramaters)
+        return sql, paramaters
     
+    @__edits_table
+    def insert_columns(self, **kw) -> int:
+        """inserts data given as columns instead of rows i.e: table.insert_columns(col1=[1, 2, 3], col2=array('d', [0.1, 0.2, 0.3])) \n
+        each column can be any sequence (list, tuple, array.array, memoryview or numpy array), all must be the same length. 
+        The type of each column is checked once rather than converting every value
+
+        Raises:
+            FortifySQLError: if the columns aren't the same length
+            SQLTypeError: if a column's values don't match the columns datatype
+
+        Returns:
+            int: number of rows inserted
+        """
+        if kw == {}: return 0
+        cols = []
+        sources = []
+        length = None
+        for col, values in kw.items():
+            column = getattr(self, col)
+            if length is None:
+                length = len(values)
+            elif len(values) != length:
+                raise FortifySQLError(f"insert_columns() columns must be the same length, {col} has {len(values)} values expected {length}")
+            cols.append(str(col))
+            sources.append(_column_source(column, values))
+        if length == 0: return 0
+        cols = '(' + ', '.join(cols) + ')'
+        values = '(' + ', '.join('?' for _ in sources) + ')'
+        sql = f"INSERT INTO {self.__name} {cols} VALUES {values}"
+        self.db.executemany(sql, zip(*sources))
+        return length
+
+    def open_blob(self, column: Column | str, rowid: int, mode: str = "r") -> sqlite3.Blob:
+        """opens a BLOB in the table as a file-like object, so large values can be read and written in chunks 
+        with .read(n), .write(data), .seek() and .tell() instead of being copied whole. \n
+        Writing can't change the size of the BLOB, insert it with the full size first (e.g. bytes(size) or zeroblob(size))
+
+        Args:
+            column (Column | str): BLOB column to open
+            rowid (int): rowid of the row
+            mode (str, optional): "r" to read or "w" to read and write. Defaults to "r".
+
+        Raises:
+            FortifySQLError: if mode isn't "r" or "w"
+            SecurityError: if mode is "w" and the table is read only
+
+        Returns:
+            sqlite3.Blob: file-like blob, close it or use it in a with statement when done
+        """
+        if mode not in ("r", "w"):
+            raise FortifySQLError(f"""open_blob() mode must be "r" or "w", got {mode}""")
+        if mode == "w" and self.read_only:
+            raise SecurityError(f"tried to edit a table that is marked as read only, table: {self}, open_blob")
+        name = column.name if isinstance(column, Column) else str(column)
+        schema, _, table = self.__name.rpartition(".") # tables of attached databases are named schema.table
+        return self.db.conn.blobopen(table, name, rowid, readonly=mode == "r", name=schema or "main")
+
     @__edits_table
     def replace(self, expr: str = "", **kw) -> None:   
         """used to replace data in a table
@@ -547,13 +1919,486 @@ class Table:
         if expr != "":
             expr = "WHERE " + expr
         self.db.query(f"DELETE FROM {self.__name} {expr}")
+
+    def __schema_table_exists(self, name: str) -> bool:
+        """checks if a table exists in the same schema as this table"""
+        schema, _, _ = self.__name.rpartition(".")
+        with self.db.lock:
+            found = self.db.conn.execute(f"SELECT 1 FROM {schema + '.' if schema else ''}sqlite_master WHERE type='table' AND name=?",
+                                         (name,)).fetchone()
+        return found is not None
+
+    def __fulltext_names(self) -> Tuple[str, str]:
+        """names used by the full text index: (table name without the schema, FTS5 table)"""
+        schema, _, name = self.__name.rpartition(".")
+        return name, f"{schema + '.' if schema else ''}fortify_fts_{name}"
+
+    def fulltext_index_exists(self) -> bool:
+        """checks if create_fulltext_index() has been called on the table"""
+        name, _ = self.__fulltext_names()
+        return self.__schema_table_exists(f"fortify_fts_{name}")
+
+    @__edits_table
+    def create_fulltext_index(self, *columns: Column | str, tokenize: str = "unicode61") -> None:
+        """Creates an FTS5 full text index (fortify_fts_{table}) over columns of the table so search() can find text
+        without scanning the whole table like LIKE '%term%' does. The index is external content, it stores no copy of the text,
+        and triggers keep it up to date on every INSERT, UPDATE and DELETE. Rows already in the table are indexed straight away
+
+        Args:
+            *columns (Column | str): TEXT columns to index
+            tokenize (str, optional): FTS5 tokenizer e.g. "porter unicode61" for stemming. Defaults to "unicode61".
+
+        Raises:
+            FortifySQLError: if no columns are given, tokenize isn't valid, the table already has an index or FTS5 isn't available
+            SecurityError: if CREATE statements are banned
+        """
+        if columns == ():
+            raise FortifySQLError("create_fulltext_index() needs at least one column")
+        if self.fulltext_index_exists():
+            raise FortifySQLError(f"{self} already has a full text index, drop_fulltext_index() first to change it")
+        if not re.fullmatch(r"[\w ]+", tokenize): # module arguments can't be parameters
+            raise FortifySQLError(f"create_fulltext_index() tokenize can only have letters, numbers and spaces, got {tokenize}")
+        cols = [getattr(self, column.name if isinstance(column, Column) else str(column)).name for column in columns]
+        name, fts = self.__fulltext_names()
+        index = f"fortify_fts_{name}" # tables in a trigger body can't have a schema
+        new = ", ".join(f"NEW.{col}" for col in cols)
+        old = ", ".join(f"OLD.{col}" for col in cols)
+        insert = f"INSERT INTO {index} (rowid, {', '.join(cols)}) VALUES (NEW.rowid, {new});"
+        delete = f"INSERT INTO {index} ({index}, rowid, {', '.join(cols)}) VALUES ('delete', OLD.rowid, {old});"
+        try:
+            with self.db.transaction():
+                self.db.query(f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(cols)}, content='{name}', "
+                              f"content_rowid='rowid', tokenize='{tokenize}')")
+                self.db.query(f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {name} BEGIN {insert} END")
+                self.db.query(f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {name} BEGIN {delete} END")
+                self.db.query(f"CREATE TRIGGER {fts}_update AFTER UPDATE ON {name} BEGIN {delete} {insert} END")
+                self.db.query(f"INSERT INTO {fts} ({index}) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            if "fts5" in str(e):
+                raise FortifySQLError(f"create_fulltext_index() needs SQLite with FTS5: {e}") from e
+            raise e
+
+    @__edits_table
+    def drop_fulltext_index(self) -> None:
+        """Removes the full text index and its triggers, and the index's tables from the database's attributes
+
+        Raises:
+            SecurityError: if dropping is disabled on the database, see Database.allow_drop()
+            SecurityError: if the table is read only
+        """
+        _, fts = self.__fulltext_names()
+        with self.db.transaction():
+            for op in ("insert", "delete", "update"):
+                self.db.query(f"DROP TRIGGER IF EXISTS {fts}_{op}")
+            self.db.query(f"DROP TABLE IF EXISTS {fts}")
+        self.__forget_fulltext_tables()
+
+    def __forget_fulltext_tables(self) -> None:
+        """removes the dropped FTS5 table and its shadow tables from Database.tables and its attributes, if they were loaded"""
+        schema, _, name = self.__name.rpartition(".")
+        owner = getattr(self.db, schema) if schema else self.db
+        dropped = {f"fortify_fts_{name}{suffix}" for suffix in ("", "_data", "_idx", "_content", "_docsize", "_config")}
+        for table in [table for table in owner.tables if str(table).rpartition(".")[2] in dropped]:
+            owner.tables.remove(table)
+            for attr, value in list(vars(owner).items()):
+                if value is table:
+                    delattr(owner, attr)
+
+    def search(self, query: str, limit: int | None = None, rank: bool = True) -> List[Tuple[Any]]:
+        """Searches the full text index and returns the matching rows of the table,
+        query uses FTS5 syntax e.g. "sqlite AND (fast OR quick)", "sql*" or "title: orm"
+
+        Args:
+            query (str): FTS5 query, passed as a parameter
+            limit (int | None, optional): most rows to return, None for all. Defaults to None.
+            rank (bool, optional): order the rows by relevance (bm25), False returns them in rowid order. Defaults to True.
+
+        Raises:
+            FortifySQLError: if the table doesn't have a full text index
+
+        Returns:
+            List[Tuple[Any]]: matching rows
+        """
+        if not self.fulltext_index_exists():
+            raise FortifySQLError(f"search() called on {self} without create_fulltext_index()")
+        name, fts = self.__fulltext_names()
+        index = f"fortify_fts_{name}"
+        sql = f"SELECT {self.__name}.* FROM {fts} AS {index} JOIN {self.__name} ON {self.__name}.rowid = {index}.rowid " \
+              f"WHERE {index} MATCH ? ORDER BY {'rank' if rank else f'{index}.rowid'}"
+        if limit is None:
+            return self.db.query(sql, (query,))
+        return self.db.query(sql + " LIMIT ?", (query, int(limit)))
+
+    def rebuild_fulltext_index(self, optimize: bool = False) -> None:
+        """Rebuilds the full text index from the table, needed if rows were changed while the triggers didn't exist. \n
+        optimize=True merges the index into one b-tree instead, making searches faster after lots of writes
+
+        Args:
+            optimize (bool, optional): optimize instead of rebuilding. Defaults to False.
+
+        Raises:
+            FortifySQLError: if the table doesn't have a full text index
+        """
+        if not self.fulltext_index_exists():
+            raise FortifySQLError(f"rebuild_fulltext_index() called on {self} without create_fulltext_index()")
+        name, fts = self.__fulltext_names()
+        command = "optimize" if optimize else "rebuild"
+        self.db.query(f"INSERT INTO {fts} (fortify_fts_{name}) VALUES ('{command}')")
+
+    def __change_log_names(self) -> Tuple[str, str, str]:
+        """names used by the change log: (schema prefix, table name without the schema, change table)"""
+        schema, _, name = self.__name.rpartition(".")
+        schema = schema + "." if schema else ""
+        return schema, name, f"{schema}fortify_changes_{name}"
+
+    def change_log_enabled(self) -> bool:
+        """checks if enable_change_log() has been called on the table"""
+        _, name, _ = self.__change_log_names()
+        return self.__schema_table_exists(f"fortify_changes_{name}")
+
+    @__edits_table
+    def enable_change_log(self) -> None:
+        """Records every INSERT, UPDATE and DELETE on the table in a change table (fortify_changes_{table}) using triggers,
+        each change is (seq, rowid, op) where op is "I", "U" or "D" and seq only ever goes up. \n
+        Consumers keep the last seq they've seen and call changes_since(seq) to sync in O(changes) instead of scanning the table,
+        use prune_changes() once every consumer has seen a change. Calling it again does nothing
+
+        Raises:
+            FortifySQLError: if the table is a WITHOUT ROWID table
+            SecurityError: if CREATE statements are banned
+        """
+        if "WITHOUT ROWID" in str(self.sql).upper():
+            raise FortifySQLError(f"enable_change_log() needs a rowid, {self} is a WITHOUT ROWID table")
+        schema, name, changes = self.__change_log_names()
+        log = f"INSERT INTO fortify_changes_{name} (row_id, op)" # tables in a trigger body can't have a schema
+        with self.db.transaction():
+            self.db.query(f"CREATE TABLE IF NOT EXISTS {changes} (seq INTEGER PRIMARY KEY AUTOINCREMENT, row_id INTEGER NOT NULL, op TEXT NOT NULL)")
+            self.db.query(f"CREATE TRIGGER IF NOT EXISTS {schema}fortify_changes_{name}_insert AFTER INSERT ON {name} "
+                          f"BEGIN {log} VALUES (NEW.rowid, 'I'); END")
+            self.db.query(f"CREATE TRIGGER IF NOT EXISTS {schema}fortify_changes_{name}_update AFTER UPDATE ON {name} "
+                          f"BEGIN {log} SELECT OLD.rowid, 'D' WHERE OLD.rowid != NEW.rowid; {log} VALUES (NEW.rowid, 'U'); END")
+            self.db.query(f"CREATE TRIGGER IF NOT EXISTS {schema}fortify_changes_{name}_delete AFTER DELETE ON {name} "
+                          f"BEGIN {log} VALUES (OLD.rowid, 'D'); END")
+
+    def disable_change_log(self, keep_changes: bool = False) -> None:
+        """Removes the change log triggers so changes stop being recorded
+
+        Args:
+            keep_changes (bool, optional): keep the change table so the recorded changes can still be read. Defaults to False.
+
+        Raises:
+            SecurityError: if dropping is disabled on the database, see Database.allow_drop()
+        """
+        schema, name, changes = self.__change_log_names()
+        with self.db.transaction():
+            for op in ("insert", "update", "delete"):
+                self.db.query(f"DROP TRIGGER IF EXISTS {schema}fortify_changes_{name}_{op}")
+            if not keep_changes:
+                self.db.query(f"DROP TABLE IF EXISTS {changes}")
+
+    def changes_since(self, seq: int = 0, with_rows: bool = False) -> Iterator[Tuple[Any]]:
+        """streams the changes recorded after seq in the order they happened, see enable_change_log()
+
+        Args:
+            seq (int, optional): last seq the consumer has seen, 0 for every change. Defaults to 0.
+            with_rows (bool, optional): add the current values of the row after (seq, rowid, op),
+                all None if the row has been deleted since. Defaults to False.
+
+        Raises:
+            FortifySQLError: if the change log isn't enabled
+
+        Returns:
+            Iterator[Tuple[Any]]: (seq, rowid, op) or (seq, rowid, op, *row) with with_rows, checked straight away and streamed as it's iterated
+        """
+        if not self.change_log_enabled():
+            raise FortifySQLError(f"changes_since() called on {self} without enable_change_log()")
+        _, _, changes = self.__change_log_names()
+        if with_rows:
+            sql = f"SELECT changes.seq, changes.row_id, changes.op, {self.__name}.* FROM {changes} AS changes " \
+                  f"LEFT JOIN {self.__name} ON {self.__name}.rowid = changes.row_id WHERE changes.seq > ? ORDER BY changes.seq"
+        else:
+            sql = f"SELECT seq, row_id, op FROM {changes} WHERE seq > ? ORDER BY seq"
+        return self.__stream(sql, (int(seq),))
+
+    def __stream(self, sql: str, parameters: tuple) -> Iterator[Tuple[Any]]:
+        """used by changes_since(), streams the rows of a query and closes the cursor afterwards"""
+        cur = self.db.execute(sql, parameters)
+        try:
+            yield from cur
+        finally:
+            cur.close()
+
+    def last_change(self) -> int:
+        """the seq of the newest recorded change, 0 if there are none. A new consumer can start from here"""
+        if not self.change_log_enabled():
+            raise FortifySQLError(f"last_change() called on {self} without enable_change_log()")
+        _, _, changes = self.__change_log_names()
+        return self.db.query(f"SELECT coalesce(max(seq), 0) FROM {changes}")[0][0]
+
+    def prune_changes(self, up_to: int) -> int:
+        """deletes recorded changes with a seq up to and including up_to, call it with the lowest seq every consumer has seen
+
+        Args:
+            up_to (int): newest seq to delete
+
+        Raises:
+            FortifySQLError: if the change log isn't enabled
+
+        Returns:
+            int: number of changes deleted
+        """
+        if not self.change_log_enabled():
+            raise FortifySQLError(f"prune_changes() called on {self} without enable_change_log()")
+        _, _, changes = self.__change_log_names()
+        with self.db.transaction():
+            count = self.db.query(f"SELECT count(*) FROM {changes} WHERE seq <= ?", (int(up_to),))[0][0]
+            self.db.query(f"DELETE FROM {changes} WHERE seq <= ?", (int(up_to),))
+        return count
         
-    def pretty_print(self, limit: str | int = None):
-        to_print = Select(self).select().pretty_print(limit=limit)
+    @__edits_table
+    def import_file(self, path: str, format: str = "csv", chunk_size: int = 10000, reject_path: str = "",
+                    progress: Callable[[dict], Any] | None = None, encoding: str = "utf-8") -> dict:
+        """streams a CSV (with a header) or JSONL file into the table, files ending in .gz are decompressed \n
+        rows are read chunk_size at a time, each column of a chunk is converted to the columns datatype in one go
+        and the chunk is inserted with executemany in its own transaction so memory use doesn't grow with the file. 
+        Rows that can't be converted or inserted are written to reject_path as JSONL instead of stopping the import
+
+        Args:
+            path (str): path to the file
+            format (str, optional): "csv" or "jsonl". Defaults to "csv".
+            chunk_size (int, optional): rows per transaction. Defaults to 10000.
+            reject_path (str, optional): JSONL file bad rows are written to, if "" they're only counted. Defaults to "".
+            progress (Callable[[dict], Any] | None, optional): called with the stats after every chunk. Defaults to None.
+            encoding (str, optional): file encoding. Defaults to "utf-8".
+
+        Raises:
+            FortifySQLError: if format isn't "csv" or "jsonl"
+            FortifySQLError: if the file has a column that isn't in the table
+
+        Returns:
+            dict: stats of the import, {"rows": inserted, "rejected": rejected, "seconds": time taken, "rows_per_second": throughput}
+        """
+        if format not in ("csv", "jsonl"):
+            raise FortifySQLError(f"""import_file() format must be "csv" or "jsonl", got {format}""")
+        stats = {"rows": 0, "rejected": 0, "seconds": 0.0, "rows_per_second": 0.0}
+        start = time.perf_counter()
+        opener = gzip.open if path.endswith(".gz") else open
+        reject_file = None
+        try:
+            with opener(path, "rt", encoding=encoding, newline="") as file:
+                records = _read_records(file, format, [column.name for column in self.columns])
+                names = next(records, None)
+                if names is None:
+                    return stats
+                for name in names:
+                    if not isinstance(getattr(self, name, None), Column):
+                        raise FortifySQLError(f"import_file() column {name} isn't in table {self}")
+                dtypes = [getattr(self, name).dtype for name in names]
+
+                while True:
+                    chunk = list(itertools.islice(records, chunk_size))
+                    if chunk == []:
+                        break
+                    rows, rejects = _coerce_records(chunk, dtypes, format)
+                    groups = {} # JSONL records are inserted with only the keys they have, so missing columns get their DEFAULT
+                    for line, raw, values in rows:
+                        present = tuple(n for n, name in enumerate(names) if not isinstance(raw, dict) or name in raw)
+                        groups.setdefault(present, []).append((line, raw, tuple(values[n] for n in present)))
+                    for present, group in groups.items():
+                        cols = [names[n] for n in present]
+                        sql = f"INSERT INTO {self.__name} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+                        try:
+                            written = self.db.executemany(sql, (values for _, _, values in group))
+                        except sqlite3.DatabaseError:
+                            written = None
+                        if written is not None:
+                            stats["rows"] += len(group)
+                            continue
+                        with self.db.transaction(): # find the bad rows one at a time
+                            for line, raw, values in group:
+                                try:
+                                    self.db.conn.execute(sql, values)
+                                    stats["rows"] += 1
+                                except sqlite3.DatabaseError as e:
+                                    rejects.append((line, raw, e))
+                    if rejects != [] and reject_path != "":
+                        if reject_file is None:
+                            reject_file = open(reject_path, "w", encoding=encoding)
+                        for line, raw, error in sorted(rejects, key=lambda reject: reject[0]):
+                            reject_file.write(json.dumps({"line": line, "error": str(error), "row": raw}, default=str) + "\n")
+                    stats["rejected"] += len(rejects)
+                    stats["seconds"] = time.perf_counter() - start
+                    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+                    if progress is not None:
+                        progress(dict(stats))
+        finally:
+            if reject_file is not None:
+                reject_file.close()
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def export(self, path_or_stream, format: str = "csv", batch_size: int = 1000, compress: bool | None = None) -> int:
+        """streams the whole table to a CSV or JSONL file, see Selectable.export()"""
+        return Select(self).select().export(path_or_stream, format=format, batch_size=batch_size, compress=compress)
+
+    def pretty_print(self, limit: str | int = None, **kw):
+        """prints the table nicely to console, see Selectable.pretty_print() for the keyword arguments"""
+        to_print = Select(self).select().pretty_print(limit=limit, **kw)
         return to_print
          
+_INT_FORMATS = "bBhHiIlLqQ?"
+_FLOAT_FORMATS = "efd"
+_ACCEPTED_TYPES = {Integer: (int,), Real: (int, float), Blob: (bytes, bytearray, memoryview)}
+
+def _column_source(column: Column, values) -> Iterable:
+    """checks the type of every value in a sequence for a column and returns an iterable of values sqlite3 can bind. 
+    arrays and memoryviews are checked once by their format
+
+    Args:
+        column (Column): column the values are inserted into
+        values (Sequence): list, tuple, array.array, memoryview or numpy array
+
+    Raises:
+        SQLTypeError: if the values don't match the columns datatype
+
+    Returns:
+        Iterable: values to be zipped into rows
+    """
+    if isinstance(values, (array, memoryview)):
+        fmt = values.typecode if isinstance(values, array) else values.format.lstrip("@=<>!")
+        if isinstance(values, memoryview) and values.ndim != 1:
+            raise SQLTypeError(f"memoryview for column {column} must be 1 dimensional")
+        kinds = {int if fmt in _INT_FORMATS else float if fmt in _FLOAT_FORMATS else str}
+    else:
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            if values.ndim != 1:
+                raise SQLTypeError(f"numpy array for column {column} must be 1 dimensional")
+            values = values.tolist() # numpy scalars can't be bound by sqlite3, tolist() makes them python values
+        kinds = {int if type(value) is bool else type(value) for value in values if value is not None}
+
+    accepted = _ACCEPTED_TYPES.get(column.dtype)
+    for kind in kinds:
+        if accepted is not None and not issubclass(kind, accepted):
+            raise SQLTypeError(f"can't insert values of type {kind.__name__} into {column.dtype.sql_text} column {column}")
+    return values
+
+def _print_rows(col_names: List[str], rows: List[Tuple[Any]], max_width: int | None) -> None:
+    """prints rows as a PrettyTable for Selectable.pretty_print(), values are cut to max_width characters"""
+    prettytable = PrettyTable(col_names)
+    if max_width is not None:
+        rows = [[value if len(value := str(cell)) <= max_width else value[:max(max_width - 3, 0)] + "..." for cell in row]
+                for row in rows]
+    prettytable.add_rows(rows)
+    print(prettytable)
+
+def _json_default(value: Any) -> str:
+    """used by json.dumps() in Selectable.export() for values JSON doesn't support, and for BLOBs in CSV"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+def _read_records(file, format: str, columns: List[str]) -> Iterator:
+    """reads a CSV or JSONL file one record at a time for Table.import_file()
+
+    Args:
+        file (TextIO): open file
+        format (str): "csv" or "jsonl"
+        columns (List[str]): columns of the table, the names JSONL records can use
+
+    Yields:
+        first the column names (the CSV header, or columns for JSONL), then (line number, raw record, values or the error reading it)
+        for each record, the raw record of JSONL is the parsed object so the keys it has are known
+    """
+    if format == "csv":
+        reader = csv.reader(file)
+        names = next(reader, None)
+        if names is None:
+            return
+        yield names
+        for values in reader:
+            if len(values) != len(names):
+                yield reader.line_num, values, FortifySQLError(f"expected {len(names)} values got {len(values)}")
+            else:
+                yield reader.line_num, values, values
+        return
+
+    yield columns
+    for line, raw in enumerate(file, 1):
+        if raw.strip() == "":
+            continue
+        try:
+            record = json.loads(raw)
+            if not isinstance(record, dict):
+                raise FortifySQLError("JSONL records must be objects")
+        except (ValueError, FortifySQLError) as e:
+            yield line, raw.rstrip("\r\n"), e
+            continue
+        if not record.keys() <= set(columns):
+            yield line, record, FortifySQLError(f"unknown columns {', '.join(record.keys() - set(columns))}")
+        else:
+            yield line, record, [record.get(name) for name in columns]
+
+def _coerce_records(chunk: List[tuple], dtypes: List[type], format: str) -> Tuple[List[tuple], List[tuple]]:
+    """converts a chunk of records from _read_records() to the columns datatypes, one column at a time
+
+    Returns:
+        Tuple[List[tuple], List[tuple]]: (line, raw, values) rows ready to insert and (line, raw, error) rejected rows
+    """
+    rejects = [(line, raw, values) for line, raw, values in chunk if isinstance(values, Exception)]
+    chunk = [record for record in chunk if not isinstance(record[2], Exception)]
+    if chunk == []:
+        return [], rejects
+    columns = [list(values) for values in zip(*(values for _, _, values in chunk))]
+    if format == "csv": # CSV has no NULL, an empty value in a non TEXT column is taken as NULL
+        for n, dtype in enumerate(dtypes):
+            if dtype is not Text:
+                columns[n] = [None if value == "" else value for value in columns[n]]
+    try:
+        columns = [coerce_many(dtype, values) for dtype, values in zip(dtypes, columns)]
+        return [(line, raw, values) for (line, raw, _), values in zip(chunk, zip(*columns))], rejects
+    except Exception: # convert row by row to find the bad ones, any value that can't be converted only rejects its row
+        rows = []
+        for (line, raw, _), values in zip(chunk, zip(*columns)):
+            try:
+                rows.append((line, raw, tuple(coerce(dtype, value) for dtype, value in zip(dtypes, values))))
+            except Exception as e:
+                rejects.append((line, raw, e))
+        return rows, rejects
+
+def _foreign_key_condition(tables: List[Table], other: Table) -> LogicalString:
+    """infers the ON clause for joining other onto a statement from the foreign keys between them
+
+    Args:
+        tables (List[Table]): tables already in the statement
+        other (Table): table being joined
+
+    Raises:
+        FortifySQLError: if there isn't exactly one foreign key between other and the tables
+
+    Returns:
+        LogicalString: join condition e.g. posts.user_id = users.id
+    """
+    candidates = []
+    for table in tables:
+        for child, parent in ((table, other), (other, table)):
+            keys = {}
+            for row in child.db.conn.execute(child._pragma("foreign_key_list")).fetchall():
+                # row: (id, seq, table, from, to, on_update, on_delete, match)
+                if row[2].lower() == str(parent).rsplit(".", 1)[-1].lower():
+                    keys.setdefault(row[0], []).append((row[3], row[4]))
+            for pairs in keys.values():
+                if any(to is None for _, to in pairs): # references the parents primary key
+                    primary_key = [row[1] for row in sorted(parent.db.conn.execute(parent._pragma("table_info")).fetchall(), 
+                                                            key=lambda row: row[5]) if row[5] > 0]
+                    pairs = [(frm, to) for (frm, _), to in zip(pairs, primary_key)]
+                candidates.append(" AND ".join(f"{child}.{frm} = {parent}.{to}" for frm, to in pairs))
+    if len(candidates) != 1:
+        raise FortifySQLError(f"join() found {len(candidates)} foreign keys to {other}, pass on= to choose the join condition")
+    return LogicalString(candidates[0])
+
 class Column:
-    used_in_join = False
+    used_in_join = False # deprecated, join() doesn't set it anymore. Setting it still makes str() write table.column
     def __init__(self, name: str, dtype, table: Table):
         """Used to represent a column in the FortifySQL ORM
 
@@ -588,8 +2433,15 @@ class Column:
         Returns:
             str: name of the column
         """
+        if getattr(getattr(self.table, "db", None), "attached", {}) and "." not in str(self.table):
+            # an attached database can have a table with the same name, so main tables are qualified with their schema
+            return LogicalString(f"main.{self.table}.{self.name}")
         return LogicalString(f"{self.table}.{self.name}")
     
+    def __operands(self, other: Column) -> Tuple[str, str]:
+        """formats two columns for a comparison, qualified as table.column like every comparison so they work in joins"""
+        return repr(self), repr(other)
+
     def __eq__(self, value: object) -> str:
         """used for query formatting i.e: table.where(column1 == column2)
 
@@ -601,11 +2453,11 @@ class Column:
         """
 
         if isinstance(value, Column):
-            return LogicalString(f"{self} = {value}")
+            return LogicalString("{} = {}".format(*self.__operands(value)))
         if isinstance(value, primitives):
-            return LogicalString(f"{self} = {self.dtype(value)}")
+            return LogicalString(f"{self!r} = {self.dtype(value)}")
         if value == "?":
-            return LogicalString(f"{self} = ?")
+            return LogicalString(f"{self!r} = ?")
 
     def __le__(self, value: object):
         """used for query formatting i.e: table.where(column1 <= column2)
@@ -617,11 +2469,11 @@ class Column:
             str: returns SQL expression
         """
         if isinstance(value, Column):
-            return LogicalString(f"{self} <= {value}")
+            return LogicalString("{} <= {}".format(*self.__operands(value)))
         if isinstance(value, primitives):
-            return LogicalString(f"{self} <= {self.dtype(value)}")
+            return LogicalString(f"{self!r} <= {self.dtype(value)}")
         if value == "?":
-            return LogicalString(f"{self} <= ?")
+            return LogicalString(f"{self!r} <= ?")
 
     def __ge__(self, value: object):
         """used for query formatting i.e: table.where(column1 >= column2)
@@ -633,11 +2485,11 @@ class Column:
             str: returns SQL expression
         """
         if isinstance(value, Column):
-            return LogicalString(f"{self} >= {value}")
+            return LogicalString("{} >= {}".format(*self.__operands(value)))
         if isinstance(value, primitives):
-            return LogicalString(f"{self} >= {self.dtype(value)}")
+            return LogicalString(f"{self!r} >= {self.dtype(value)}")
         if value == "?":
-            return LogicalString(f"{self} >= ?")
+            return LogicalString(f"{self!r} >= ?")
 
     def __gt__(self, value: object):
         """used for query formatting i.e: table.where(column1 > column2)
@@ -650,11 +2502,11 @@ class Column:
         """
 
         if isinstance(value, Column):
-            return LogicalString(f"{self} > {value}")
+            return LogicalString("{} > {}".format(*self.__operands(value)))
         if isinstance(value, primitives):
-            return LogicalString(f"{self} >= {self.dtype(value)}")
+            return LogicalString(f"{self!r} >= {self.dtype(value)}")
         if value == "?":
-            return LogicalString(f"{self} > ?")
+            return LogicalString(f"{self!r} > ?")
 
     def __lt__(self, value: object):
         """used for query formatting i.e: table.where(column1 < column2)
@@ -667,11 +2519,11 @@ class Column:
         """
 
         if isinstance(value, Column):
-            return LogicalString(f"{self} < {value}")
+            return LogicalString("{} < {}".format(*self.__operands(value)))
         if isinstance(value, primitives):
-            return LogicalString(f"{self} < {self.dtype(value)}")
+            return LogicalString(f"{self!r} < {self.dtype(value)}")
         if value == "?":
-            return LogicalString(f"{self} < ?")
+            return LogicalString(f"{self!r} < ?")
 
     def __ne__(self, value: object):
         """used for query formatting i.e: table.where(column1 != column2)
@@ -683,11 +2535,11 @@ class Column:
             str: returns SQL expression
         """
         if isinstance(value, Column):
-            return LogicalString(f"{self} != {value}")
+            return LogicalString("{} != {}".format(*self.__operands(value)))
         if isinstance(value, primitives):
-            return LogicalString(f"{self} != {self.dtype(value)}")        
+            return LogicalString(f"{self!r} != {self.dtype(value)}")        
         if value == "?":
-            return LogicalString(f"{self} != ?")
+            return LogicalString(f"{self!r} != ?")
 
 class BaseStatement:
     """base class that other Statement types are built from"""
@@ -705,75 +2557,209 @@ class BaseStatement:
 
 class Selectable(BaseStatement):
     """base class for all queries that return data"""
-    def first(self, *parameters) -> List[Any]:
+    def _run(self, parameters: tuple, timeout: float | None = None) -> List[Tuple[Any]]:
+        """runs the statement with Database.query(), recording it for the index advisor if track_workload() is on"""
+        db = self.table.db
+        if db.workload is None:
+            return db.query(self.statement, parameters, timeout=timeout)
+        start = time.perf_counter()
+        data = db.query(self.statement, parameters, timeout=timeout)
+        db._record_select(self, parameters, time.perf_counter() - start)
+        return data
+
+    def first(self, *parameters, timeout: float | None = None) -> List[Any]:
         """returns the first row of data from a selectable query
 
         Args:
             *paramaters (optional): parameters to pass through query
+            timeout (float | None, optional): seconds the query can run for, see Database.query(). Defaults to None.
 
         Returns:
             List[Any]: first row of data
         """
-        data = self.table.db.query(self.statement, parameters)
+        data = self._run(parameters, timeout)
         if len(data) >= 1:
             return data[0]
         else:
             return None
     
-    def all(self, *parameters) -> List[Tuple[Any]]:
+    def all(self, *parameters, timeout: float | None = None) -> List[Tuple[Any]]:
         """returns all data from a query
 
         Args:
             *paramaters (optional): parameters to pass through query
+            timeout (float | None, optional): seconds the query can run for, see Database.query(). Defaults to None.
 
         Returns:
             List[Tuple[Any]]: data from query
         """
-        return self.table.db.query(self.statement, parameters)
+        return self._run(parameters, timeout)
     
-    def limit(self, limit: str | int, *paramaters):
+    def limit(self, limit: str | int, *paramaters, timeout: float | None = None):
         """used to limit the amount of data returned
         
         Args:
             args (str, int): the maximum amount of rows that can be returned 
+            timeout (float | None, optional): seconds the query can run for, see Database.query(). Defaults to None.
         """
         self.statement += "LIMIT " + str(limit) + " "
-        return self.table.db.query(self.statement, paramaters)
+        return self._run(paramaters, timeout)
     
-    def pretty_print(self, *parameters, limit: str | int = None):
-        """used to print the data from the request nicely to console, uses pandas 
+    def to_columns(self, *parameters, batch_size: int = 1000, as_numpy: bool = False) -> dict:
+        """streams the result of a query into one buffer per column instead of a list of rows \n
+        INTEGER and REAL columns are stored in array.array buffers ('q' and 'd'), or numpy arrays if as_numpy is True,
+        everything else (TEXT, BLOB, expressions, columns containing NULL) is stored in a list
 
         Args:
+            *paramaters (optional): parameters to pass through query
+            batch_size (int, optional): how many rows are fetched from the cursor at a time. Defaults to 1000.
+            as_numpy (bool, optional): convert the numeric buffers to numpy arrays, requires numpy. Defaults to False.
+
+        Raises:
+            FortifySQLError: if as_numpy is True and numpy isn't installed
+
+        Returns:
+            dict: column name -> buffer of values
+        """
+        if as_numpy and numpy is None:
+            raise FortifySQLError("to_columns(as_numpy=True) requires numpy to be installed")
+        cur = self.table.db.execute(self.statement, parameters)
+        try:
+            if cur.description is None:
+                return {}
+            names = [description[0] for description in cur.description]
+            buffers = []
+            for name in names:
+                column = getattr(self.table, name, None)
+                typecode = getattr(column.dtype, "array_typecode", None) if isinstance(column, Column) else None # dtype is None for e.g. INT
+                buffers.append(array(typecode) if typecode else [])
+
+            rows = cur.fetchmany(batch_size)
+            while rows:
+                for n, values in enumerate(zip(*rows)):
+                    buffer = buffers[n]
+                    length = len(buffer)
+                    try:
+                        buffer.extend(values)
+                    except (TypeError, OverflowError): # NULL or non numeric value, fall back to a list
+                        del buffer[length:]
+                        buffers[n] = buffer.tolist()
+                        buffers[n].extend(values)
+                rows = cur.fetchmany(batch_size)
+        finally:
+            cur.close()
+
+        if as_numpy:
+            buffers = [numpy.frombuffer(buffer, dtype=buffer.typecode) if isinstance(buffer, array) else buffer 
+                       for buffer in buffers]
+        return dict(zip(names, buffers))
+
+    def export(self, path_or_stream, *parameters, format: str = "csv", batch_size: int = 1000, compress: bool | None = None) -> int:
+        """streams the data from a query to a CSV (with a header) or JSONL file, batch_size rows at a time
+        so memory use stays the same no matter how big the result is. BLOBs are written as hex strings. 
+        The query is ran before the file is opened, so a query that fails doesn't empty an existing file
+
+        Args:
+            path_or_stream (str | TextIO): path to write to, or an open text stream
+            *paramaters (optional): parameters to pass through query
+            format (str, optional): "csv" or "jsonl". Defaults to "csv".
+            batch_size (int, optional): how many rows are fetched from the cursor at a time. Defaults to 1000.
+            compress (bool | None, optional): gzip the file, if None paths ending in .gz are compressed. Defaults to None.
+
+        Raises:
+            FortifySQLError: if format isn't "csv" or "jsonl"
+
+        Returns:
+            int: number of rows written
+        """
+        if format not in ("csv", "jsonl"):
+            raise FortifySQLError(f"""export() format must be "csv" or "jsonl", got {format}""")
+        count = 0
+        cur = self.table.db.execute(self.statement, parameters)
+        file = path_or_stream
+        try:
+            if isinstance(path_or_stream, (str, os.PathLike)):
+                path = os.fspath(path_or_stream)
+                if compress or (compress is None and path.endswith(".gz")):
+                    file = gzip.open(path, "wt", encoding="utf-8", newline="")
+                else:
+                    file = open(path, "w", encoding="utf-8", newline="")
+            names = [description[0] for description in cur.description]
+            if format == "csv":
+                writer = csv.writer(file)
+                writer.writerow(names)
+            rows = cur.fetchmany(batch_size)
+            while rows:
+                if format == "csv":
+                    writer.writerows([_json_default(value) if isinstance(value, (bytes, bytearray, memoryview)) else value 
+                                      for value in row] for row in rows)
+                else:
+                    file.writelines(json.dumps(dict(zip(names, row)), default=_json_default) + "\n" for row in rows)
+                count += len(rows)
+                rows = cur.fetchmany(batch_size)
+        finally:
+            cur.close()
+            if file is not path_or_stream:
+                file.close()
+        return count
+
+    def pretty_print(self, *parameters, limit: str | int = None, max_rows: int | None = 50, tail: int = 0,
+                     max_width: int | None = 40, page_size: int | None = None):
+        """used to print the data from the request nicely to console, uses prettytable \n
+        rows are streamed from the cursor so only the rows being printed are held in memory, 
+        by default the first 50 rows are printed and values longer than 40 characters are cut short
+
+        Args:
+            *paramaters (optional): parameters to pass through query
             limit (str | int, optional): how many rows to be returned. Defaults to None.
+            max_rows (int | None, optional): most rows to print, None prints every row. Defaults to 50.
+            tail (int, optional): how many of max_rows are taken from the end of the data instead of the start. Defaults to 0.
+            max_width (int | None, optional): longest a printed value can be, None for no limit. Defaults to 40.
+            page_size (int | None, optional): print a table every page_size rows instead of all at once. Defaults to None.
+
+        Returns:
+            List[Tuple[Any]]: the rows that were printed
         """
         if limit:
             self.statement += "LIMIT " + str(limit) + " "
-        request = self.statement
+        if max_rows is not None and not 0 <= tail <= max_rows:
+            raise FortifySQLError(f"pretty_print() tail must be between 0 and max_rows ({max_rows}), got {tail}")
+        head_size = None if max_rows is None else max_rows - tail
         
-        db = self.table.db
-        parsed = sqlparse.parse(request)
-        if not len(parsed) == 1:
-            raise SecurityError("Multiple statements not allowed in a single query")
+        cur = self.table.db.execute(self.statement, parameters)
+        try:
+            col_names = [description[0] for description in cur.description]
+            printed = []
+            page = []
+            tail_rows = deque(maxlen=tail)
+            skipped = 0
+            more = False
+            for row in cur:
+                if head_size is None or len(printed) + len(page) < head_size:
+                    page.append(row)
+                    if page_size is not None and len(page) == page_size:
+                        _print_rows(col_names, page, max_width)
+                        printed += page
+                        page = []
+                elif tail > 0:
+                    if len(tail_rows) == tail:
+                        skipped += 1
+                    tail_rows.append(row)
+                else:
+                    more = True
+                    break
+        finally:
+            cur.close()
 
-        if db.banned_statements != []:
-            if parsed[0].get_type().upper() in db.banned_statements:
-                raise SecurityError(f"Attempted to execute banned statement: {request}")
-
-        if db.banned_syntax != []:
-            for banned in db.banned_syntax:
-                if banned in request:
-                    raise SecurityError(f"Attempted to execute banned syntax: {request}")
-                
-        cur = db.conn.cursor()
-        cur.execute(request, parameters)
-        data = cur.fetchall()
-        col_names = [description[0] for description in cur.description]
-        db.conn.commit()
-        cur.close()
-        prettytable = PrettyTable(col_names)
-        prettytable.add_rows(data)
-        print(prettytable)
-        return data     
+        if page != [] or tail_rows or printed == []:
+            separator = [tuple("..." for _ in col_names)] if skipped else []
+            _print_rows(col_names, page + separator + list(tail_rows), max_width)
+        printed += page + list(tail_rows)
+        if skipped:
+            print(f"{skipped} rows not shown")
+        elif more:
+            print(f"more rows not shown, showing the first {max_rows}")
+        return printed
 
 class Select(Selectable):
     """used to select data from a table"""
@@ -783,11 +2769,15 @@ class Select(Selectable):
         Returns:
             self: used for method chain
         """
+        self.cols = cols
+        self.select_type = "SELECT"
+        self.joins = []
         if cols == (): # if no columns are given then assume * wildcard
             cols = "*"
         else:
             cols = ", ".join(str(col) for col in cols) # format columns
         self.statement += f"SELECT {cols} FROM {self.table} "
+        self.from_end = len(self.statement)
         return self
     
     def distinct(self, *cols):
@@ -796,11 +2786,55 @@ class Select(Selectable):
         Returns:
             self: used for method chain
         """
+        self.cols = cols
+        self.select_type = "SELECT DISTINCT"
+        self.joins = []
         if cols == (): # if no columns are given then assume * wildcard
             cols = "*"
         else:
             cols = ", ".join(str(col) for col in cols) # format columns
         self.statement += f"SELECT DISTINCT {cols} FROM {self.table} "
+        self.from_end = len(self.statement)
+        return self
+
+    def _column_sql(self, col) -> str:
+        """formats a column for the statement, as table.column once a table has been joined so it isn't ambiguous"""
+        if isinstance(col, Column) and getattr(self, "joins", []) != []:
+            return repr(col)
+        return str(col)
+
+    def join(self, other: Table, on: str = "", how: str = "inner"):
+        """joins another table onto the statement i.e: users.get(users.name, posts.title).join(posts) \n
+        if on isn't given it is inferred from the foreign keys between the tables. 
+        Once joined, columns given to the select, .filter(**kw), .order() and .group() are written as table.column, 
+        comparisons (e.g. users.id == 3) always are so they can be used in .filter() too. Must be called before .filter(), .order() etc.
+
+        Args:
+            other (Table): table to join
+            on (str, optional): join condition e.g. users.id == posts.user_id. Defaults to "" (use foreign keys).
+            how (str, optional): "inner" or "left". Defaults to "inner".
+
+        Raises:
+            FortifySQLError: if how isn't "inner" or "left"
+            FortifySQLError: if join is called after filter/order/group
+            FortifySQLError: if on isn't given and there isn't exactly one foreign key between the tables
+
+        Returns:
+            self: used for method chain
+        """
+        if how.lower() not in ("inner", "left"):
+            raise FortifySQLError(f"""join() how must be "inner" or "left", got {how}""")
+        if len(self.statement) != self.from_end:
+            raise FortifySQLError(".join() must be called before .filter(), .order(), .group() etc.")
+        tables = [self.table, *(joined for joined, _ in self.joins)]
+        if on == "":
+            on = _foreign_key_condition(tables, other)
+        self.joins.append((other, f"{how.upper()} JOIN {other} ON {on}"))
+
+        cols = "*" if self.cols == () else ", ".join(self._column_sql(col) for col in self.cols)
+        joins = " ".join(join for _, join in self.joins)
+        self.statement = f"{self.select_type} {cols} FROM {self.table} {joins} "
+        self.from_end = len(self.statement)
         return self
     
     def filter(self, expr: str = "", **kw):
@@ -823,11 +2857,123 @@ class Select(Selectable):
             if isinstance(val, Select):
                 val = f"({repr(val)})"
             column = getattr(self.table, col)
-            expr += f"{str(col)} = {column.dtype(val)} AND"
+            expr += f"{self._column_sql(column)} = {column.dtype(val)} AND"
         expr = re.sub(r'\s*AND\s*$', "", expr)
         self.statement += f"WHERE {expr} " 
         return self           
     
+    def paginate(self, *parameters, order_by: Column | str | Iterable[Column | str], page_size: int = 100, 
+                 descending: bool = False) -> Iterator[List[Tuple[Any]]]:
+        """yields the data from a query a page at a time using keyset pagination i.e: WHERE (key) > (last key seen) \n
+        unlike OFFSET every page costs the same as the first, as long as order_by is indexed. 
+        The order_by columns must be selected and together be unique and not NULL, e.g. the primary key
+
+        Args:
+            *paramaters (optional): parameters to pass through query
+            order_by (Column | str | Iterable[Column | str]): column or columns (composite key) to page by
+            page_size (int, optional): maximum amount of rows in each page. Defaults to 100.
+            descending (bool, optional): page from the largest key to the smallest. Defaults to False.
+
+        Raises:
+            FortifySQLError: if an order_by column isn't in the selected columns
+
+        Returns:
+            Iterator[List[Tuple[Any]]]: each page of data, order_by is checked straight away and the pages fetched as it's iterated
+        """
+        if isinstance(order_by, (Column, str)):
+            order_by = (order_by,)
+        keys = [key.name if isinstance(key, Column) else str(key) for key in order_by]
+        direction = " DESC" if descending else ""
+        operator = "<" if descending else ">"
+        order = ", ".join(f"{key}{direction}" for key in keys)
+        first_page = f"SELECT * FROM ({self.statement}) ORDER BY {order} LIMIT {int(page_size)}"
+        next_page = f"SELECT * FROM ({self.statement}) WHERE ({', '.join(keys)}) {operator} ({', '.join('?' for _ in keys)}) " \
+                    f"ORDER BY {order} LIMIT {int(page_size)}"
+
+        db = self.table.db
+        cur = db.execute(f"SELECT * FROM ({self.statement}) LIMIT 0", parameters)
+        names = [description[0] for description in cur.description]
+        cur.close()
+        for key in keys:
+            if key not in names:
+                raise FortifySQLError(f"paginate() order_by column {key} must be in the selected columns")
+        positions = [names.index(key) for key in keys]
+        return self.__pages(first_page, next_page, parameters, positions, page_size)
+
+    def __pages(self, first_page: str, next_page: str, parameters: tuple, positions: List[int], page_size: int) -> Iterator[List[Tuple[Any]]]:
+        """used by paginate(), fetches a page at a time starting after the key of the last row of the page before"""
+        db = self.table.db
+        cur = db.execute(first_page, parameters)
+        while True:
+            page = cur.fetchall()
+            cur.close()
+            if page == []:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last_seen = tuple(page[-1][n] for n in positions)
+            cur = db.execute(next_page, (*parameters, *last_seen))
+
+    def parallel_map(self, func: Callable[[Tuple[Any]], Any], *parameters, workers: int | None = None, 
+                     reduce: Callable[[Any, Any], Any] | None = None, initial: Any = None, batch_size: int = 1000) -> Any:
+        """applies func to every row of the query using a pool of processes, for CPU heavy python that SQLite can't do \n
+        the table is split into rowid ranges, each worker opens its own read only connection and streams its range. 
+        func (and reduce) must be picklable, i.e. defined at the top level of a module, and the database must be a file. 
+        Only committed data is seen by the workers
+
+        Args:
+            func (Callable[[Tuple[Any]], Any]): called with each row
+            *paramaters (optional): parameters to pass through query
+            workers (int | None, optional): number of processes, None uses the number of CPUs. Defaults to None.
+            reduce (Callable[[Any, Any], Any] | None, optional): combines two results, each worker reduces its own range 
+                and the partial results are reduced together starting from initial. Defaults to None.
+            initial (Any, optional): starting value for reduce. Defaults to None.
+            batch_size (int, optional): how many rows each worker fetches at a time. Defaults to 1000.
+
+        Raises:
+            FortifySQLError: if the database is :memory:
+            FortifySQLError: if the query needs every row at once to be right, i.e. DISTINCT, aggregate or window functions, 
+                GROUP BY, HAVING, ORDER BY, LIMIT, OFFSET or UNION
+
+        Returns:
+            Any: list of func(row) in rowid order, or the reduced result if reduce is given
+        """
+        db = self.table.db
+        if db.path == ":memory:":
+            raise FortifySQLError("parallel_map() needs a database file, can't be used with :memory:")
+        if self.select_type != "SELECT":
+            raise FortifySQLError("parallel_map() can't be used on a DISTINCT query")
+        whole_result = _whole_result_feature(self.statement, {name.lower() for (name, _), (kind, _, _) in db.functions.items() 
+                                                              if kind != "function"})
+        if whole_result is not None:
+            raise FortifySQLError(f"parallel_map() can't be used on a query with {whole_result}, each worker only sees one rowid range")
+        statement = f"SELECT * FROM (SELECT {self.table}.rowid AS fortify_rowid, {self.statement[len('SELECT '):]}) " \
+                     "WHERE fortify_rowid BETWEEN ? AND ?"
+        db._check_request(statement, (*parameters, 0, 0))
+        if db.writer is not None:
+            db.writer.flush()
+        low, high = db.conn.execute(f"SELECT min(rowid), max(rowid) FROM {self.table}").fetchone()
+
+        workers = workers or os.cpu_count() or 1
+        partials = []
+        if low is not None:
+            step = -(-(high - low + 1) // (workers * 4)) # a few ranges per worker so they finish together
+            uri = pathlib.Path(db.path).absolute().as_uri() + "?mode=ro"
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_scan_partition, uri, statement, (*parameters, start, start + step - 1), 
+                                       func, reduce, batch_size) for start in range(low, high + 1, step)]
+                partials = [future.result() for future in futures]
+
+        if reduce is None:
+            return [value for partial in partials for value in partial]
+        has_result, result = initial is not None, initial
+        for has_value, value in partials:
+            if has_value:
+                result = reduce(result, value) if has_result else value
+                has_result = True
+        return result
+
     def _and(self, expr: str):
         """used to add a AND operator to a statement
 
@@ -852,19 +2998,34 @@ class Select(Selectable):
         self.statement += "OR " + expr + " "
         return self  
     
+    def union(self, other: Self, all: bool = True):
+        """used to combine the rows of another select into this one, both run in one statement inside SQLite 
+        so tables from attached databases can be combined e.g. db.events.get().union(db.archive.events.get()) \n
+        filter both selects before the union, an .order() or .limit() after it applies to the combined rows
+
+        Args:
+            other (Select): select with the same number of columns
+            all (bool, optional): True for UNION ALL (keeps duplicates), False for UNION. Defaults to True.
+
+        Returns:
+            self: returns itself class NOT the data, use .all() or similar to get the data
+        """
+        self.statement += ("UNION ALL " if all else "UNION ") + other.statement
+        return self
+
     def group(self, *args, having=""):
         """used to group data from a SQL statistical funtion
 
         Args:
             args (str): columns/aliases to group by
         """
-        self.statement += "GROUP BY" + ", ".join(args) + " "
+        self.statement += "GROUP BY " + ", ".join(self._column_sql(arg) for arg in args) + " "
         if having != "":
             self.statement += "HAVING " + having + " "
         return self
     
     def order(self, *args):
         """used to determine the order that data is returned"""
-        self.statement += "ORDER BY " + ", ".join(args) + " "
+        self.statement += "ORDER BY " + ", ".join(self._column_sql(arg) for arg in args) + " "
         return self
     
\ No newline at end of file
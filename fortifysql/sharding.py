@@ -0,0 +1,293 @@
+"""
+Splitting a database across multiple SQLite files, see ShardedDatabase
+"""
+import bisect
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import sqlparse
+
+from .orm import Database, Table, Column, Select, _whole_result_feature, _WHOLE_RESULT_CLAUSES
+from .errors import FortifySQLError
+
+def hash_shard(key: Any, shards: int) -> int:
+    """default shard function, a stable hash (crc32) of the key modulo the number of shards. 
+    Numbers SQLite stores the same way hash the same, i.e. 5, 5.0 and 1, True"""
+    if isinstance(key, bool) or (isinstance(key, float) and key.is_integer()):
+        key = int(key)
+    return zlib.crc32(str(key).encode()) % shards
+
+def range_shard(boundaries: List[Any]) -> Callable[[Any, int], int]:
+    """makes a shard function that splits keys by range, boundaries are the first key of every shard after the first
+    i.e: range_shard([1000, 2000]) puts keys < 1000 in shard 0, 1000 to 1999 in shard 1 and >= 2000 in shard 2"""
+    def shard(key: Any, shards: int) -> int:
+        return min(bisect.bisect_right(boundaries, key), shards - 1)
+    return shard
+
+def _for_every_shard(name: str) -> Callable:
+    """makes a method that calls the Database method of the same name on every shard"""
+    def method(self, *args, **kw):
+        for shard in self.shards:
+            getattr(shard, name)(*args, **kw)
+    method.__name__ = name
+    method.__doc__ = f"calls Database.{name}() on every shard, so all shards follow the same rules"
+    return method
+
+class ShardedDatabase:
+    """Wraps one Database per SQLite file, rows are routed to a shard by their shard key"""
+    def __init__(self, paths: List[str], shard_key: str | Dict[str, str] = "id",
+                 shard_func: Callable[[Any, int], int] = hash_shard, check_same_thread: bool = False) -> None:
+        """Wraps one Database per SQLite file, rows are routed to a shard by their shard key \n
+        tables are loaded from the first shard and become attributes like in Database, every shard must have the same tables
+
+        Args:
+            paths (List[str]): paths to the database files, one per shard
+            shard_key (str | Dict[str, str], optional): column used to pick the shard, or a dict of table name -> column. Defaults to "id".
+            shard_func (Callable[[Any, int], int], optional): takes a key and the number of shards and returns the shard index,
+                see hash_shard() and range_shard(). Defaults to hash_shard.
+            check_same_thread (bool, optional): passed to each Database. Defaults to False.
+        """
+        if paths == []:
+            raise FortifySQLError("ShardedDatabase needs at least one path")
+        self.shards = [Database(path, check_same_thread) for path in paths]
+        self.shard_key = shard_key
+        self.shard_func = shard_func
+        self.reload_tables()
+
+    def reload_tables(self) -> None:
+        """reloads the tables of every shard and the sharded tables"""
+        self.tables = []
+        for shard in self.shards:
+            shard.reload_tables()
+        for table in self.shards[0].tables:
+            sharded = ShardedTable(self, str(table))
+            self.tables.append(sharded)
+            if not hasattr(self, str(sharded)) or isinstance(getattr(self, str(sharded)), ShardedTable):
+                setattr(self, str(sharded), sharded)
+
+    def key_for(self, table: str) -> str:
+        """the shard key column of a table"""
+        if isinstance(self.shard_key, dict):
+            return self.shard_key[table]
+        return self.shard_key
+
+    def shard_for(self, key: Any) -> int:
+        """the index of the shard a key belongs to"""
+        return self.shard_func(key, len(self.shards))
+
+    def query(self, request: str, parameters: tuple = (), all_shards: bool = False) -> List[Tuple[Any]]:
+        """runs a query on every shard in parallel and returns all of the data together \n
+        only SELECTs run by default, other statements would run once per shard (i.e. an INSERT would be duplicated),
+        so inserts should go through ShardedTable.append() which routes rows by their shard key
+
+        Args:
+            request (str): the statement
+            parameters (tuple, optional): the statement's parameters. Defaults to ().
+            all_shards (bool, optional): allows statements that aren't a SELECT to run on every shard, e.g. CREATE TABLE. Defaults to False.
+
+        Raises:
+            FortifySQLError: if the statement isn't a SELECT and all_shards isn't set
+
+        Returns:
+            List[Tuple[Any]]: the rows of every shard
+        """
+        parsed = sqlparse.parse(request)
+        if not all_shards and (len(parsed) != 1 or parsed[0].get_type().upper() != "SELECT"):
+            raise FortifySQLError("ShardedDatabase.query() only runs SELECTs unless all_shards=True, insert rows with ShardedTable.append()")
+        with ThreadPoolExecutor(len(self.shards)) as pool:
+            results = pool.map(lambda shard: shard.query(request, parameters), self.shards)
+        return [row for data in results if data for row in data]
+
+    allow_drop = _for_every_shard("allow_drop")
+    error_catch = _for_every_shard("error_catch")
+    delete_checking = _for_every_shard("delete_checking")
+    add_banned_statement = _for_every_shard("add_banned_statement")
+    remove_banned_statement = _for_every_shard("remove_banned_statement")
+    add_banned_syntax = _for_every_shard("add_banned_syntax")
+    remove_banned_syntax = _for_every_shard("remove_banned_syntax")
+    import_configuration = _for_every_shard("import_configuration")
+    row_factory = _for_every_shard("row_factory")
+    query_logging = _for_every_shard("query_logging")
+    retry_policy = _for_every_shard("retry_policy")
+    query_timeout = _for_every_shard("query_timeout")
+    cancel = _for_every_shard("cancel")
+    result_budget = _for_every_shard("result_budget")
+    scan_guard = _for_every_shard("scan_guard")
+    allow_full_scan = _for_every_shard("allow_full_scan")
+    maintenance = _for_every_shard("maintenance")
+    close = _for_every_shard("close")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+class ShardedTable:
+    """A table that is split across the shards of a ShardedDatabase"""
+    def __init__(self, db: ShardedDatabase, name: str) -> None:
+        """A table that is split across the shards of a ShardedDatabase, columns are attributes like in Table
+
+        Args:
+            db (ShardedDatabase): database the table is on
+            name (str): name of the table
+        """
+        self.db = db
+        self.__name = name
+        self.shard_tables: List[Table] = []
+        for shard in db.shards:
+            tables = [table for table in shard.tables if str(table) == name]
+            if tables == []:
+                raise FortifySQLError(f"table {name} is missing from shard {shard.path}")
+            self.shard_tables.append(tables[0])
+        self.columns = self.shard_tables[0].columns
+        for column in self.columns:
+            if not hasattr(self, column.name):
+                setattr(self, column.name, column)
+
+    def __str__(self) -> str:
+        return self.__name
+
+    def __call__(self):
+        """returns all data in the table from every shard"""
+        return self.get().all()
+
+    def __shard_of(self, kw: dict) -> Table | None:
+        """the shard table a set of column = value belongs to, None if the shard key isn't in them"""
+        key = self.db.key_for(self.__name)
+        if key not in kw:
+            return None
+        return self.shard_tables[self.db.shard_for(kw[key])]
+
+    def append(self, **kw):
+        """appends a row to the shard its shard key belongs to
+
+        Raises:
+            FortifySQLError: if the shard key isn't given
+        """
+        table = self.__shard_of(kw)
+        if table is None:
+            raise FortifySQLError(f"append() on sharded table {self} needs the shard key {self.db.key_for(self.__name)}")
+        return table.append(**kw)
+
+    def get(self, *cols):
+        """gets data from every shard, NOTE: use .first(), .all() etc. to return the data"""
+        return ShardedSelect(self, [table.get(*cols) for table in self.shard_tables])
+
+    def get_distinct(self, *cols):
+        """gets distinct data from every shard, rows are only distinct within a shard"""
+        return ShardedSelect(self, [table.get_distinct(*cols) for table in self.shard_tables])
+
+    def filter(self, expr: str = "", **kw):
+        """gets data where an expression is true, if the shard key is given as a keyword only its shard is queried"""
+        table = self.__shard_of(kw) if expr == "" else None
+        tables = self.shard_tables if table is None else [table]
+        return ShardedSelect(self, [table.filter(expr, **kw) for table in tables])
+
+    def replace(self, expr: str = "", **kw) -> None:
+        """replaces data on every shard, see Table.replace()
+
+        Raises:
+            FortifySQLError: if the shard key is changed, the row would be left on the wrong shard
+        """
+        key = self.db.key_for(self.__name)
+        if key in kw:
+            raise FortifySQLError(f"replace() can't change the shard key {key} of sharded table {self}, remove() the row and append() it instead")
+        for table in self.shard_tables:
+            table.replace(expr, **kw)
+
+    def remove(self, expr: str = "", **kw) -> None:
+        """removes data, if the shard key is given as a keyword only its shard is changed, see Table.remove()"""
+        table = self.__shard_of(kw) if expr == "" else None
+        for table in (self.shard_tables if table is None else [table]):
+            table.remove(expr, **kw)
+
+class ShardedSelect:
+    """Runs a Select on several shards in parallel threads and merges the results,
+    ORDER BY and LIMIT are applied again after merging so the result matches a single database. 
+    Selects whose rows can't just be put together (aggregates, GROUP BY etc.) are rejected"""
+    def __init__(self, table: ShardedTable, selects: List[Select]) -> None:
+        self.table = table
+        self.selects = selects
+        self.order_by: List[Tuple[str, bool]] = []
+
+    def __forward(self, name: str, *args, **kw):
+        for select in self.selects:
+            getattr(select, name)(*args, **kw)
+        return self
+
+    def filter(self, expr: str = "", **kw):
+        """adds a WHERE clause on every shard, see Select.filter()"""
+        return self.__forward("filter", expr, **kw)
+
+    def _and(self, expr: str):
+        """adds an AND on every shard, see Select._and()"""
+        return self.__forward("_and", expr)
+
+    def _or(self, expr: str):
+        """adds an OR on every shard, see Select._or()"""
+        return self.__forward("_or", expr)
+
+    def order(self, *args):
+        """orders the data on every shard and again after merging, args are columns or strings like "col DESC" """
+        for arg in args:
+            if isinstance(arg, Column):
+                self.order_by.append((arg.name, False))
+            else:
+                name, _, direction = str(arg).strip().partition(" ")
+                self.order_by.append((name.rsplit(".", 1)[-1], direction.strip().upper() == "DESC"))
+        return self.__forward("order", *args)
+
+    def __check_mergeable(self) -> None:
+        """raises if the results of the shards can't be merged by putting the rows together"""
+        clauses = _WHOLE_RESULT_CLAUSES - ({"ORDER BY"} if self.order_by != [] else set()) # .order() is merged
+        aggregates = {name.lower() for (name, _), (kind, _, _) in self.table.db.shards[0].functions.items() if kind != "function"}
+        feature = _whole_result_feature(self.selects[0].statement, aggregates, clauses)
+        if feature is not None:
+            raise FortifySQLError(f"can't merge a select with {feature} across shards, run it on each shard and combine the results")
+
+    def __run(self, parameters: tuple, limit: int | None = None) -> List[Tuple[Any]]:
+        self.__check_mergeable()
+        def run(select: Select) -> Tuple[List[str], List[Tuple[Any]]]:
+            statement = select.statement if limit is None else select.statement + f"LIMIT {int(limit)} "
+            cur = select.table.db.execute(statement, parameters)
+            try:
+                return [description[0] for description in cur.description], cur.fetchall()
+            finally:
+                cur.close()
+
+        with ThreadPoolExecutor(len(self.selects)) as pool:
+            results = list(pool.map(run, self.selects))
+        rows = [row for _, data in results for row in data]
+        if self.order_by != [] and results != []:
+            names = results[0][0]
+            for name, descending in reversed(self.order_by): # stable sorts, least important key first
+                if name not in names:
+                    raise FortifySQLError(f"can't merge shards ordered by {name}, it must be in the selected columns")
+                index = names.index(name)
+                rows.sort(key=lambda row: _sort_key(row[index]), reverse=descending)
+        return rows if limit is None else rows[:limit]
+
+    def all(self, *parameters) -> List[Tuple[Any]]:
+        """returns all data from every shard"""
+        return self.__run(parameters)
+
+    def first(self, *parameters) -> Tuple[Any] | None:
+        """returns the first row of the merged data"""
+        data = self.__run(parameters, 1)
+        return data[0] if data != [] else None
+
+    def limit(self, limit: str | int, *parameters) -> List[Tuple[Any]]:
+        """returns at most limit rows of the merged data, each shard is limited too"""
+        return self.__run(parameters, int(limit))
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """sorts python values the way SQLite does: NULL, then numbers, then text, then blobs"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
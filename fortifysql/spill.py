@@ -0,0 +1,100 @@
+"""
+Query results that are too big for memory, see Database.result_budget()
+"""
+import bisect
+import itertools
+import pickle
+import sqlite3
+import tempfile
+from collections.abc import Sequence
+from typing import Any, Iterable, List
+
+from .errors import FortifySQLError
+
+def row_size(row) -> int:
+    """rough number of bytes a row takes up in memory, text and blobs are counted by their length"""
+    size = 56 + 8 * len(row) # tuple header and pointers
+    for value in row:
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            size += 49 + len(value)
+        else:
+            size += 24
+    return size
+
+class SpilledResult(Sequence):
+    """The result of a query that went over the result budget, the rows that fit are kept in memory and the rest are
+    written to a temporary file in pickled batches. It can be used like a list (len, indexing, slicing, iterating),
+    batches are read back from the file when they're needed. \n
+    sqlite3.Row rows are spilled as tuples, call close() or use it in a with statement to delete the file
+    """
+    def __init__(self, head: List[Any], rows: Iterable[Any], batch_size: int = 1000) -> None:
+        """Writes the remaining rows of a result to a temporary file
+
+        Args:
+            head (List[Any]): rows kept in memory
+            rows (Iterable[Any]): rows to spill, normally the rest of a cursor
+            batch_size (int, optional): rows per pickled batch, the most rows read back at a time. Defaults to 1000.
+        """
+        self.head = head
+        self.file = tempfile.TemporaryFile(prefix="fortifysql-")
+        self.offsets = [] # file position of each batch
+        self.starts = [] # index of the first row in each batch
+        self.length = len(head)
+        self.__cached = (-1, [])
+        rows = iter(rows)
+        batch = list(itertools.islice(rows, batch_size))
+        while batch:
+            batch = [tuple(row) if isinstance(row, sqlite3.Row) else row for row in batch]
+            self.offsets.append(self.file.tell())
+            self.starts.append(self.length)
+            pickle.dump(batch, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.length += len(batch)
+            batch = list(itertools.islice(rows, batch_size))
+        self.file.flush()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __batch(self, batch: int) -> List[Any]:
+        """reads a batch back from the file, the last batch read is cached"""
+        if self.__cached[0] != batch:
+            if self.file.closed:
+                raise FortifySQLError("tried to read a spilled result after close()")
+            self.file.seek(self.offsets[batch])
+            self.__cached = (batch, pickle.load(self.file))
+        return self.__cached[1]
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("spilled result index out of range")
+        if index < len(self.head):
+            return self.head[index]
+        batch = bisect.bisect_right(self.starts, index) - 1
+        return self.__batch(batch)[index - self.starts[batch]]
+
+    def __iter__(self):
+        yield from self.head
+        for batch in range(len(self.offsets)):
+            yield from self.__batch(batch)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Sequence) or len(other) != self.length:
+            return False
+        return all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"<SpilledResult {self.length} rows, {len(self.head)} in memory>"
+
+    def close(self) -> None:
+        """deletes the temporary file"""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
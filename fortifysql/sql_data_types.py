@@ -2,10 +2,48 @@
 Classes for all the data types in SQLite
 """
 from numbers import Number
-from typing import Any, Self
+from typing import Any, Iterable, List, Self
 
 from .errors import SQLTypeError
 
+# types sqlite3 binds as a BLOB without needing to be copied into bytes
+_BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+def _to_integer(number: Number | str) -> int:
+    """converts a single value to a python int for an INTEGER, bytes aren't numbers so they're rejected"""
+    if isinstance(number, _BUFFER_TYPES):
+        raise SQLTypeError(f"Error in converting {number!r} to INTEGER: bytes can't be an INTEGER")
+    try:
+        return int(number)
+    except (ValueError, TypeError, OverflowError) as e:
+        if isinstance(number, complex):
+            return _to_integer(number.real)
+        raise SQLTypeError(f"Error in converting {number!r} to INTEGER: {e}")
+
+def _to_real(number: Number | str) -> float:
+    """converts a single value to a python float for a REAL, bytes aren't numbers so they're rejected"""
+    if isinstance(number, _BUFFER_TYPES):
+        raise SQLTypeError(f"Error in converting {number!r} to REAL: bytes can't be a REAL")
+    try:
+        return float(number)
+    except (ValueError, TypeError, OverflowError) as e:
+        if isinstance(number, complex):
+            return number.real
+        raise SQLTypeError(f"Error in converting {number!r} to REAL: {e}")
+
+def _to_text(text: Any) -> str:
+    """converts a single value to a python str for a TEXT"""
+    return text if type(text) is str else str(text)
+
+def _to_blob(bites: Any) -> bytes | bytearray | memoryview:
+    """converts a single value to bytes for a BLOB, bytes, bytearray and memoryview values aren't copied"""
+    if isinstance(bites, _BUFFER_TYPES):
+        return bites
+    try:
+        return bytes(bites)
+    except Exception as e:
+        raise SQLTypeError(f"Error in converting to bytes {e}")
+
 class LogicalString(str):
     """instead of logical operators such as and returning a bool, a and b will return the string f"{a} AND {b}"
 
@@ -47,9 +85,10 @@ class LogicalString(str):
 class SQLDataType: # used for typing
     """Do not use class SQLDataType on it's own, for typechecking only
     """
+    __slots__ = ("value",)
     python_equiv = ...
     sql_text = ...
-    value = ...
+    array_typecode = None # array.array typecode used for columnar buffers, None if it can't be stored in one
     
     def __init__(self, value):
         if isinstance(value, Literal):
@@ -61,9 +100,13 @@ class Null(SQLDataType):
     """
     SQLite NULL datatype
     """
+    __slots__ = ()
     python_equiv = None
     sql_text = "NULL"
     value = "NULL"
+
+    def __init__(self, value=None) -> None:
+        pass
     
     def __str__(self):
         return self.value
@@ -72,20 +115,12 @@ class Integer(SQLDataType):
     """
     SQLite3 INTEGER datatype
     """
+    __slots__ = ()
     sql_text = "INTEGER"
     python_equiv = int
+    array_typecode = "q"
     def __init__(self, number: Number | str) -> None:
-        if isinstance(number, str): # check if given string is valid
-            for char in number:
-                try:
-                    int(char)
-                except ValueError:
-                    raise SQLTypeError(f"Error in converting string to INTEGER, value {char} failed")
-
-        if isinstance(number, complex):
-            number = number.real    
-
-        self.value: int = int(number)
+        self.value: int = _to_integer(number)
         
         super().__init__(number)
 
@@ -96,19 +131,12 @@ class Real(SQLDataType):
     """
     SQLite3 REAL datatype
     """
+    __slots__ = ()
     sql_text = "REAL"
     python_equiv = float
+    array_typecode = "d"
     def __init__(self, number: Number | str):
-        if isinstance(number, str):
-            try:
-                number = float(number)
-            except ValueError as e:
-                raise SQLTypeError(f"Error in converting string to REAL, value failed: {e}")
-
-        if isinstance(number, complex):
-            number = number.real
-        
-        self.value = float(number)
+        self.value = _to_real(number)
         super().__init__(number)
 
     def __str__(self):
@@ -118,6 +146,7 @@ class Text(SQLDataType):
     """
     SQLite3 TEXT datatype
     """
+    __slots__ = ()
     python_equiv = str
     sql_text = "TEXT"
     def __init__(self, text) -> None:
@@ -132,22 +161,20 @@ class Text(SQLDataType):
 
 class Blob(SQLDataType):
     """
-    SQLite3 BLOB datatype (bytes)
+    SQLite3 BLOB datatype (bytes), bytearray and memoryview values are kept as they are instead of being copied
     """
+    __slots__ = ("encoding",)
     python_equiv = bytes
     sql_text = "BLOB"
     def __init__(self, bites: bytes=None, bytes_like: Any=None, encoding: str="") -> None:
         if bites is not None and bytes_like is not None:
             raise SQLTypeError(f"Blob() cannot have two inputs: {bites} and {bytes_like}")
-        elif bites is not None and isinstance(bites, bytes):
+        elif bites is not None and isinstance(bites, _BUFFER_TYPES):
             self.value = bites
             value = bites
         elif bytes_like is not None:
-            try:
-                self.value = bytes(bytes_like)
-                value = bytes_like
-            except Exception as e:
-                raise SQLTypeError(f"Error in converting to bytes {e}")
+            self.value = _to_blob(bytes_like)
+            value = bytes_like
         else:
             raise SQLTypeError(f"Invalid inputs to Blob() {bites}, {bytes_like}")
         
@@ -155,13 +182,16 @@ class Blob(SQLDataType):
         super().__init__(value)
 
     def __str__(self) -> str:
+        value = self.value if isinstance(self.value, bytes) else bytes(self.value)
         if self.encoding != "":
-            return "'" + str(self.value.decode(self.encoding)) + "'"
+            return "'" + str(value.decode(self.encoding)) + "'"
         else:
-            return str(self.value)[1:]
+            return str(value)[1:]
 
 class Literal(Text):
     """special data type for parameterisation and subqueries"""
+    __slots__ = ()
+
     def __str__(self):
         return self.value
 
@@ -186,6 +216,70 @@ def get_dtype(text: str):
         case "":
             return Text
  
+# python type -> SQL datatype, checked before falling back to isinstance checks
+_CASTS = {str: Text, int: Integer, bool: Integer, float: Real, complex: Real, 
+          bytes: Blob, bytearray: Blob, memoryview: Blob, type(None): Null}
+
+# SQL datatype -> (fast converter used with map() when there are no NULLs, converter for a single value)
+_CONVERTERS = {
+    Integer: (int, _to_integer),
+    Real: (float, _to_real),
+    Text: (None, _to_text),
+    Blob: (None, _to_blob),
+}
+
+def coerce(dtype: type[SQLDataType], value: Any) -> Any:
+    """converts a value to the python value sqlite3 binds for a SQL datatype without creating a SQLDataType instance
+
+    Args:
+        dtype (type[SQLDataType]): SQL datatype e.g. Column.dtype, None (a declared type get_dtype() doesn't know) keeps the value as it is
+        value (Any): value to convert
+
+    Raises:
+        SQLTypeError: if the value can't be converted
+
+    Returns:
+        Any: int, float, str, bytes or None
+    """
+    if dtype is None:
+        return value
+    if value is None or dtype is Null:
+        return None
+    converters = _CONVERTERS.get(dtype)
+    if converters is None:
+        return dtype(value).value
+    return converters[1](value)
+
+def coerce_many(dtype: type[SQLDataType], values: Iterable[Any]) -> List[Any]:
+    """converts a whole column of values for a SQL datatype in one call, see coerce(). NULLs (None) are kept as None
+
+    Args:
+        dtype (type[SQLDataType]): SQL datatype e.g. Column.dtype, None (a declared type get_dtype() doesn't know) keeps the values as they are
+        values (Iterable[Any]): values to convert
+
+    Raises:
+        SQLTypeError: if a value can't be converted
+
+    Returns:
+        List[Any]: converted values
+    """
+    if not isinstance(values, (list, tuple)):
+        values = list(values)
+    if dtype is None:
+        return list(values)
+    if dtype is Null:
+        return [None] * len(values)
+    converters = _CONVERTERS.get(dtype)
+    if converters is None:
+        return [coerce(dtype, value) for value in values]
+    fast, convert = converters
+    if fast is not None and None not in values and not any(isinstance(value, _BUFFER_TYPES) for value in values):
+        try:
+            return list(map(fast, values))
+        except (ValueError, TypeError, OverflowError):
+            pass # let convert raise the SQLTypeError for the bad value
+    return [None if value is None else convert(value) for value in values]
+
 def cast_sql_dtype(value: Any) -> SQLDataType:
     """assinges a SQL datatype to any value passed through
 
@@ -195,6 +289,11 @@ def cast_sql_dtype(value: Any) -> SQLDataType:
     Returns:
         _type_: _description_
     """
+    dtype = _CASTS.get(type(value))
+    if dtype is not None:
+        if dtype is Text and value == '?':
+            return Literal(value)
+        return dtype(value)
     if isinstance(value, str):
         if value == '?':
             return Literal(value)
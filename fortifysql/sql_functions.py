@@ -66,4 +66,19 @@ def round(x: str, y: int=0):
     """rounds x to the y decimal places"""
     return LogicalString(f"round({x}, {y})")
 
-__all__ = ["absolute", "changes", "char", "iif", "like", "max", "min", "random", "round"]
\ No newline at end of file
+def function_builder(name: str):
+    """makes an expression builder for a function registered on a database, see Database.function()
+
+    Args:
+        name (str): name of the SQL function
+
+    Returns:
+        Callable: builder that formats the function as name(x, y, ...), pass over="..." for a window function
+    """
+    def builder(*args: str, over: str = "") -> LogicalString:
+        call = f"{name}({', '.join(str(arg) for arg in args)})"
+        return LogicalString(call if over == "" else f"{call} OVER ({over})")
+    builder.__name__ = name
+    return builder
+
+__all__ = ["absolute", "changes", "char", "iif", "like", "max", "min", "random", "round", "function_builder"]
\ No newline at end of file
@@ -1,4 +1,12 @@
-from fortifysql.orm import Database, sqlite3
+import gc
+import threading
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fortifysql.orm import Database, sqlite3, _scanned_table
+from fortifysql.errors import DatabaseBusyError, FortifySQLError, SecurityError, QueryTimeoutError, QueryCancelledError, ResultTooLargeError, FullScanError, FullScanWarning
+from fortifysql.spill import SpilledResult
+from fortifysql.sharding import ShardedDatabase, hash_shard, range_shard
 import os
 
 def test_basic_queries():
@@ -172,4 +180,440 @@ def test_json_config():
     except:
         pass
 
-    assert test_passed
\ No newline at end of file
+    assert test_passed
+
+def test_write_behind():
+    database = Database(":memory:")
+    database.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Age INTEGER, Name TEXT)")
+    database.reload_tables()
+    writer = database.write_behind(batch_size=50, flush_interval=0.01)
+    def append_people(start):
+        return [database.people.append(Id=n, Age=n % 90, Name=str(n)) for n in range(start, start + 100)]
+    with ThreadPoolExecutor(4) as pool:
+        futures = [future for batch in pool.map(append_people, range(0, 400, 100)) for future in batch]
+    writer.flush()
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert database.query("SELECT count(*) FROM people") == [(400,)]
+    failed = database.people.append(Id=1, Age=1, Name="duplicate")
+    ok = database.people.append(Id=400, Age=1, Name="new")
+    writer.flush()
+    assert isinstance(failed.exception(), sqlite3.IntegrityError) and ok.exception() is None
+    database.error_catch(True)
+    failed = database.people.append(Id=1, Age=1, Name="duplicate") # error_catch() doesn't hide failed appends
+    writer.flush()
+    assert isinstance(failed.exception(), sqlite3.IntegrityError)
+    database.error_catch(False)
+    database.write_behind(False)
+    with pytest.raises(FortifySQLError):
+        writer.flush()
+    assert database.people.append(Id=401, Age=1, Name="sync") is None
+    assert database.query("SELECT count(*) FROM people") == [(402,)]
+
+    writer = database.write_behind(batch_size=1)
+    with database.lock: # the writer waits for the lock with the first append, so the second stays queued
+        written = database.people.append(Id=500, Age=1, Name="written")
+        cancelled = database.people.append(Id=501, Age=1, Name="cancelled")
+        assert cancelled.cancel()
+    writer.flush(5) # a cancelled append doesn't stop the writer
+    assert written.result() is None and database.query("SELECT count(*) FROM people WHERE Id >= 500") == [(1,)]
+    with database.transaction():
+        with pytest.raises(FortifySQLError): # the writer needs the connection the transaction holds
+            writer.flush(5)
+    database.people.remove(Id=500)
+
+    writer = database.write_behind()
+    database.people.append(Id=402, Age=1, Name="queued")
+    thread = writer.thread
+    writer.flush()
+    del database, failed, ok # tracebacks of failed appends reference the database
+    gc.collect() # tables and their database reference each other
+    thread.join(5) # garbage collecting the database stops the writer
+    assert not thread.is_alive() and writer.closed
+
+def test_busy_retry(tmp_path):
+    path = str(tmp_path / "busy.db")
+    open(path, "x").close()
+    holder = Database(path)
+    holder.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Name TEXT)")
+    waiter = Database(path)
+    waiter.retry_policy(busy_timeout=0.01, max_retries=2, backoff=0.01, max_backoff=0.01)
+    with holder.transaction():
+        holder.query("INSERT INTO people (Id, Name) VALUES (1, 'John')")
+        try:
+            waiter.query("INSERT INTO people (Id, Name) VALUES (2, 'Jane')")
+        except DatabaseBusyError:
+            pass
+        else:
+            raise Exception("the database should be locked")
+        waiter.error_catch(True, logging=True)
+        with pytest.raises(DatabaseBusyError): # not printed and quit() by error_catch()
+            waiter.query("INSERT INTO people (Id, Name) VALUES (2, 'Jane')")
+        waiter.error_catch(False)
+    assert waiter.busy_stats["retries"] == 4 and waiter.busy_stats["failures"] == 2
+
+    waiter.retry_policy(busy_timeout=0.01, max_retries=50, backoff=0.01, max_backoff=0.05)
+    def release():
+        time.sleep(0.2)
+        holder.conn.commit()
+    holder.conn.execute("BEGIN IMMEDIATE")
+    thread = threading.Thread(target=release)
+    thread.start()
+    waiter.query("INSERT INTO people (Id, Name) VALUES (2, 'Jane')")
+    thread.join()
+    assert waiter.busy_stats["retries"] > 0 and waiter.query("SELECT count(*) FROM people") == [(2,)]
+
+    try:
+        with waiter.transaction():
+            waiter.query("INSERT INTO people (Id, Name) VALUES (3, 'Jim')")
+            raise ValueError()
+    except ValueError:
+        pass
+    assert waiter.query("SELECT count(*) FROM people") == [(2,)]
+
+    waiter.conn.execute("INSERT INTO people (Id, Name) VALUES (4, 'Jo')") # opens an implicit transaction
+    with pytest.raises(FortifySQLError):
+        waiter.query("INSERT INTO people (Id, Name) VALUES (5, 'Al')")
+    with pytest.raises(FortifySQLError):
+        with waiter.transaction():
+            pass
+    waiter.conn.rollback()
+    waiter.query("INSERT INTO people (Id, Name) VALUES (5, 'Al')")
+    assert waiter.query("SELECT Id FROM people ORDER BY Id") == [(1,), (2,), (5,)]
+
+def test_read_connections(tmp_path):
+    path = str(tmp_path / "replicas.db")
+    open(path, "x").close()
+    database = Database(path, read_connections=2)
+    database.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Name TEXT)")
+    database.query("INSERT INTO people (Id, Name) VALUES (1, 'John')")
+    traced = []
+    database.read_conns[0].set_trace_callback(traced.append)
+    assert database.query("SELECT Name FROM people") == [("John",)]
+    assert database.query("SELECT Name FROM people") == [("John",)]
+    assert traced == ["SELECT Name FROM people"]
+    try:
+        database.read_conns[1].execute("INSERT INTO people (Id, Name) VALUES (2, 'Jane')")
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise Exception("read connections should be read only")
+    with database.transaction():
+        database.query("INSERT INTO people (Id, Name) VALUES (2, 'Jane')")
+        assert database.query("SELECT count(*) FROM people") == [(2,)]
+        database.read_your_writes = False
+        assert database.query("SELECT count(*) FROM people") == [(1,)]
+        database.read_your_writes = True
+
+    in_transaction, done = threading.Event(), threading.Event()
+    def write():
+        with database.transaction():
+            database.query("INSERT INTO people (Id, Name) VALUES (3, 'Jim')")
+            in_transaction.set()
+            done.wait(5)
+    writer = threading.Thread(target=write)
+    writer.start()
+    in_transaction.wait()
+    start = time.monotonic()
+    assert database.query("SELECT count(*) FROM people") == [(2,)] # another thread's transaction, read on a read connection
+    assert time.monotonic() - start < 1 # without waiting for the transaction to finish
+    done.set()
+    writer.join()
+    database.close()
+
+def test_in_memory_copy(tmp_path):
+    path = str(tmp_path / "reference.db")
+    open(path, "x").close()
+    writer = Database(path)
+    writer.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Name TEXT)")
+    writer.query("INSERT INTO people (Id, Name) VALUES (1, 'John')")
+    database = Database(path, in_memory_copy=True, refresh_interval=0.02)
+    traced = []
+    database.memory_conn.set_trace_callback(traced.append)
+    assert database.query("SELECT Name FROM people") == [("John",)] and traced == ["SELECT Name FROM people"]
+    assert list(database.people.get_many(database.people.Id, [1, 3], temp_table_after=1)) == [(1, "John")] # TEMP table is on the main connection
+    writer.query("INSERT INTO people (Id, Name) VALUES (2, 'Jane')")
+    for _ in range(200):
+        if database.query("SELECT count(*) FROM people") == [(2,)]:
+            break
+        time.sleep(0.01)
+    assert database.query("SELECT count(*) FROM people") == [(2,)]
+
+    database.refresh_interval = 60 # no refresh during the rest of the test
+    time.sleep(0.05)
+    database.query("INSERT INTO people (Id, Name) VALUES (3, 'Bob')")
+    traced.clear()
+    assert database.query("SELECT count(*) FROM people") == [(3,)] and traced == [] # the copy is behind, read the file
+    database.query("CREATE TABLE pets (Id INTEGER PRIMARY KEY)")
+    database.reload_tables()
+    assert hasattr(database, "pets")
+    old = database.memory_conn
+    database.refresh_memory_copy()
+    with pytest.raises(sqlite3.ProgrammingError): # the old copy is closed once it's swapped out
+        old.execute("SELECT 1")
+    database.memory_conn.set_trace_callback(traced.append)
+    assert database.query("SELECT count(*) FROM people") == [(3,)] and traced == ["SELECT count(*) FROM people"]
+    old = database.memory_conn
+    cursor = database.execute("SELECT Id FROM people ORDER BY Id")
+    assert cursor.fetchone() == (1,)
+    database.refresh_memory_copy()
+    assert cursor.fetchall() == [(2,), (3,)] # kept open until the cursor using it is done
+    with pytest.raises(sqlite3.ProgrammingError):
+        old.execute("SELECT 1")
+    database.close()
+    database.close()
+    writer.close()
+
+    with Database(path, in_memory_copy=True) as database:
+        memory = database.memory_conn
+        assert database.query("SELECT count(*) FROM people") == [(3,)]
+    with pytest.raises(sqlite3.ProgrammingError):
+        memory.execute("SELECT 1")
+
+def test_sharded_database(tmp_path):
+    paths = [str(tmp_path / f"shard{i}.db") for i in range(3)]
+    for path in paths:
+        open(path, "x").close()
+    database = ShardedDatabase(paths, shard_key="Id")
+    with pytest.raises(FortifySQLError):
+        database.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Age INTEGER, Name TEXT)")
+    database.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Age INTEGER, Name TEXT)", all_shards=True)
+    database.reload_tables()
+    people = database.people
+    with pytest.raises(FortifySQLError):
+        database.query("INSERT INTO people (Id, Age, Name) VALUES (100, 1, 'duplicated')")
+    for i in range(30):
+        people.append(Id=i, Age=i % 7, Name=f"person {i}")
+    counts = [shard.query("SELECT count(*) FROM people")[0][0] for shard in database.shards]
+    assert sum(counts) == 30 and all(count > 0 for count in counts)
+    assert database.query("SELECT count(*) FROM people") == [(count,) for count in counts]
+    assert people.filter(Id=12).all() == [(12, 5, "person 12")]
+    assert len(people.filter(Id=12).selects) == 1
+    assert people.get(people.Id).order("Id DESC").limit(3) == [(29,), (28,), (27,)]
+    assert people.get().order("Age", "Id DESC").first() == (28, 0, "person 28")
+    assert [row[0] for row in people.get(people.Id).filter(people.Age == 3).order(people.Id).all()] == [3, 10, 17, 24]
+    try:
+        people.append(Age=1, Name="no key")
+    except FortifySQLError:
+        pass
+    else:
+        raise Exception("append without the shard key should raise")
+    assert hash_shard(5, 3) == hash_shard(5.0, 3) and hash_shard(1, 7) == hash_shard(True, 7)
+    assert people.filter(Id=12.0).all() == [(12, 5, "person 12")]
+    for select in (people.get("count(*)"), people.get(people.Age).filter("Age > 1 GROUP BY Age"), people.get().filter("Id > 1 ORDER BY Name")):
+        with pytest.raises(FortifySQLError):
+            select.all()
+    with pytest.raises(FortifySQLError):
+        people.replace("Id = 3", Id=100)
+    people.replace("Id = 3", Age=100)
+    assert people.filter(Id=3).first() == (3, 100, "person 3")
+    database.add_banned_statement("DELETE")
+    assert all("DELETE" in shard.banned_statements for shard in database.shards)
+    for shard in database.shards:
+        shard.close()
+
+def test_range_shard():
+    shard = range_shard([100, 200])
+    assert [shard(key, 3) for key in (0, 99, 100, 199, 200, 5000)] == [0, 0, 1, 1, 2, 2]
+
+def test_attach(tmp_path):
+    hot_path, archive_path = str(tmp_path / "hot.db"), str(tmp_path / "archive.db")
+    open(hot_path, "x").close()
+    open(archive_path, "x").close()
+    archive = Database(archive_path)
+    archive.query("CREATE TABLE events (Id INTEGER PRIMARY KEY, Name TEXT)")
+    archive.query("INSERT INTO events (Id, Name) VALUES (1, 'old')")
+    archive.query("CREATE TABLE files (Id INTEGER PRIMARY KEY, Data BLOB)")
+    archive.query("INSERT INTO files (Id, Data) VALUES (1, x'00010203')")
+    archive.close()
+
+    database = Database(hot_path, read_connections=1)
+    database.query("CREATE TABLE events (Id INTEGER PRIMARY KEY, Name TEXT)")
+    database.reload_tables()
+    database.events.append(Id=2, Name="new")
+    database.attach(archive_path, "archive")
+    assert [str(column) for column in database.archive.events.columns] == ["Id", "Name"]
+    assert database.query("SELECT count(*) FROM archive.events") == [(1,)] # on the read connection
+    events = database.events.get().union(database.archive.events.get()).order("Id").all()
+    assert events == [(1, "old"), (2, "new")]
+    joined = database.events.get(database.events.Name).join(database.archive.events, on=database.events.Id != database.archive.events.Id).all()
+    assert joined == [("new",)]
+    database.archive.events.append(Id=3, Name="older")
+    with database.archive.files.open_blob("Data", 1) as blob: # opened in the attached schema, not main
+        assert blob.read() == b"\x00\x01\x02\x03"
+    assert database.query("SELECT count(*) FROM archive.events") == [(2,)]
+    database.detach("archive")
+    assert not hasattr(database, "archive")
+
+    database.add_banned_statement("ATTACH")
+    try:
+        database.attach(archive_path, "archive")
+    except SecurityError:
+        pass
+    else:
+        raise Exception("ATTACH should follow the banned statements")
+    database.close()
+
+def test_query_timeout():
+    database = Database(":memory:")
+    runaway = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT count(*) FROM n"
+    start = time.monotonic()
+    try:
+        database.query(runaway, timeout=0.05)
+    except QueryTimeoutError:
+        pass
+    else:
+        raise Exception("query should time out")
+    assert time.monotonic() - start < 2 and database.timeout_stats["timeouts"] == 1
+    assert database.query("SELECT 1", timeout=0.05) == [(1,)]
+
+    database.query_timeout(0.05)
+    try:
+        database.query(runaway)
+    except QueryTimeoutError:
+        pass
+    else:
+        raise Exception("default timeout should apply")
+    database.query_timeout(None)
+
+    timer = threading.Timer(0.05, database.cancel)
+    timer.start()
+    try:
+        database.query(runaway)
+    except QueryCancelledError:
+        pass
+    else:
+        raise Exception("query should be cancelled")
+    timer.join()
+    assert database.timeout_stats == {"timeouts": 2, "cancelled": 1}
+
+def test_streamed_timeout(tmp_path):
+    database = Database(":memory:")
+    database.query("CREATE TABLE logs (Id INTEGER PRIMARY KEY, Message TEXT)")
+    database.executemany("INSERT INTO logs (Id, Message) VALUES (?, ?)", ((i, str(i)) for i in range(5000)))
+    database.reload_tables()
+    cur = database.execute("SELECT * FROM logs", timeout=0.05)
+    assert len(cur.fetchmany(10)) == 10
+    time.sleep(0.1)
+    with pytest.raises(QueryTimeoutError):
+        cur.fetchall()
+    assert database.query("SELECT count(*) FROM logs") == [(5000,)]
+
+    @database.function
+    def slow(value):
+        time.sleep(0.0005)
+        return value
+
+    database.query_timeout(0.05)
+    with pytest.raises(QueryTimeoutError):
+        database.logs.get(slow.sql(database.logs.Id)).export(str(tmp_path / "out.csv"))
+    database.query_timeout(0) # the unindexed IN scan is interrupted at the first progress check
+    with pytest.raises(QueryTimeoutError):
+        list(database.logs.get_many(database.logs.Message, [str(i) for i in range(100)], chunk_size=100))
+    database.query_timeout(None)
+    assert len(list(database.logs.get_many(database.logs.Id, range(100)))) == 100
+    assert database.timeout_stats["timeouts"] == 3
+
+def test_result_budget():
+    database = Database(":memory:")
+    database.query("CREATE TABLE logs (Id INTEGER PRIMARY KEY, Message TEXT)")
+    database.executemany("INSERT INTO logs (Id, Message) VALUES (?, ?)", ((i, "x" * 100) for i in range(5000)))
+    database.result_budget(10_000)
+    with database.query("SELECT * FROM logs ORDER BY Id") as rows:
+        assert isinstance(rows, SpilledResult) and len(rows) == 5000 and len(rows.head) < 100
+        assert rows[0] == (0, "x" * 100) and rows[-1] == (4999, "x" * 100) and rows[2500][0] == 2500
+        assert [row[0] for row in rows[1998:2002]] == [1998, 1999, 2000, 2001]
+        assert sum(1 for _ in rows) == 5000
+    assert database.query("SELECT count(*) FROM logs") == [(5000,)]
+    database.result_budget(10_000, policy="error")
+    try:
+        database.query("SELECT * FROM logs")
+    except ResultTooLargeError:
+        pass
+    else:
+        raise Exception("result over the budget should raise")
+    database.result_budget(None)
+    assert len(database.query("SELECT * FROM logs")) == 5000
+
+def test_scan_guard():
+    database = Database(":memory:")
+    database.query("CREATE TABLE people (Id INTEGER PRIMARY KEY, Age INTEGER, Name TEXT)")
+    database.query("CREATE INDEX people_age ON people (Age)")
+    database.executemany("INSERT INTO people (Id, Age, Name) VALUES (?, ?, ?)", ((i, i % 90, f"person {i}") for i in range(1000)))
+    database.scan_guard(min_rows=500)
+    assert database.query("SELECT Name FROM people WHERE Id = ?", (5,)) == [("person 5",)]
+    assert len(database.query("SELECT Name FROM people p WHERE p.Age = ?", (30,))) == 11
+    for request in ("SELECT * FROM people WHERE Name = 'person 5'", "SELECT count(*) FROM people p"):
+        try:
+            database.query(request)
+        except FullScanError:
+            pass
+        else:
+            raise Exception(f"full scan should be rejected: {request}")
+    with pytest.raises(FullScanError): # planned once for the template, other values share it
+        database.query("SELECT * FROM people WHERE Name = 'person 6'")
+    database.query("CREATE INDEX people_name ON people (Name)") # plans are made again after the schema changes
+    assert database.query("SELECT * FROM people WHERE Name = 'person 6'") == [(6, 6, "person 6")]
+    database.allow_drop(True)
+    database.query("DROP INDEX people_name")
+    database.allow_drop(False)
+    with pytest.raises(FullScanError):
+        database.query("SELECT * FROM people WHERE Name = 'person 6'")
+    assert _scanned_table("SCAN TABLE people") == "people" and _scanned_table("SCAN TABLE people AS p") == "people"
+    assert _scanned_table("SCAN people") == "people" and _scanned_table("SEARCH TABLE people USING INTEGER PRIMARY KEY (rowid=?)") is None
+    assert _scanned_table("SCAN TABLE search VIRTUAL TABLE INDEX 0:") is None
+    database.allow_full_scan("SELECT count(*) FROM people p")
+    assert database.query("SELECT count(*) FROM people p") == [(1000,)]
+    database.scan_guard(min_rows=500, action="warn")
+    with pytest.warns(FullScanWarning):
+        database.query("SELECT * FROM people WHERE Name = 'person 5'")
+    database.scan_guard(min_rows=5000)
+    assert database.query("SELECT * FROM people WHERE Name = 'person 5'") == [(5, 5, "person 5")]
+
+def test_maintenance(tmp_path):
+    path = str(tmp_path / "maintained.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("CREATE TABLE logs (Id INTEGER PRIMARY KEY, Message TEXT)")
+    conn.execute("CREATE INDEX logs_message ON logs (Message)")
+    conn.close()
+    database = Database(path, read_connections=1)
+    database.executemany("INSERT INTO logs (Id, Message) VALUES (?, ?)", ((i, "x" * 500) for i in range(2000)))
+    database.query("DELETE FROM logs WHERE Id >= 100")
+
+    maintainer = database.maintenance(interval=3600, budget=5)
+    database.conn.execute("PRAGMA busy_timeout = 1234")
+    streaming = database._start_deadline(database.conn, 60) # e.g. a StreamingCursor still open on the connection
+    read_conn = database.read_conns[0]
+    results = maintainer.run()
+    assert results["optimize"] and results["analyze"] and results["vacuumed_pages"] > 0
+    assert results["checkpoint"]["mode"] in ("PASSIVE", "TRUNCATE")
+    assert database.query("SELECT count(*) FROM sqlite_stat1") != [(0,)]
+    assert database.conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    assert database._Database__deadlines[database.conn] == [streaming] # other deadlines are left alone
+    database._end_deadline(database.conn, streaming)
+    assert database.read_conns[0] is not read_conn # reopened so it loads the new statistics
+    assert maintainer.run()["analyze"] is False # not due again yet
+
+    holder_ready, release = threading.Event(), threading.Event()
+    def hold():
+        with database.lock:
+            holder_ready.set()
+            release.wait()
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holder_ready.wait()
+    maintainer.budget = 0.1
+    start = time.monotonic()
+    assert maintainer.run() == {} # the connection is busy, so the run is skipped within the budget
+    assert time.monotonic() - start < 1 and maintainer.stats["skipped"] == 1
+    release.set()
+    holder.join()
+
+    database.maintenance(interval=0.02, idle=0.01)
+    for _ in range(200):
+        if database.maintainer.stats["runs"] > 0:
+            break
+        time.sleep(0.01)
+    assert database.maintainer.stats["runs"] > 0 and database.maintainer.stats["last_run"] is not None
+    database.maintenance(False)
+    database.close()
@@ -1,6 +1,14 @@
+import math
+import operator
+import csv
+import gzip
+import json
+from array import array
+
 from fortifysql.orm import Table, Column, Database
-from fortifysql.sql_data_types import Integer, Text, Real, Blob
+from fortifysql.sql_data_types import Integer, Text, Real, Blob, Null, coerce, coerce_many
 from fortifysql.sql_functions import max
+from fortifysql.errors import FortifySQLError, SQLTypeError, SecurityError
 
 def test_import_table():
     db = Database(":memory:")
@@ -37,4 +45,390 @@ def test_get_method():
     assert table.get(table.c1).filter(c1='5').all()[0] == (5,)
     assert table.get("c1").limit(2) == [('1',), ('2',)]
     assert table.get(table.c1).order("c1 DESC").all() == [('5',), ('3',), ('1',)]
-    
\ No newline at end of file
+    
+def test_to_columns():
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (c1 INTEGER, c2 REAL, c3 TEXT)")
+    db.reload_tables()
+    table: Table = db.test
+    for n in range(5):
+        table.append(c1=n, c2=n / 2, c3=f"{n}")
+    columns = table.get().to_columns(batch_size=2)
+    assert isinstance(columns["c1"], array) and columns["c1"].typecode == "q"
+    assert isinstance(columns["c2"], array) and columns["c2"].typecode == "d"
+    assert list(columns["c1"]) == [0, 1, 2, 3, 4]
+    assert columns["c3"] == ["0", "1", "2", "3", "4"]
+    db.query("INSERT INTO test (c1, c2, c3) VALUES (NULL, 1.5, 'x')")
+    assert table.get(table.c1).to_columns()["c1"] == [0, 1, 2, 3, 4, None]
+    db.query("CREATE TABLE loose (id INT, name VARCHAR(20), created DATETIME)") # types get_dtype() doesn't know
+    db.query("INSERT INTO loose (id, name, created) VALUES (1, 'a', '2024-01-01')")
+    db.reload_tables()
+    assert db.loose.get().to_columns() == {"id": [1], "name": ["a"], "created": ["2024-01-01"]}
+
+def test_insert_columns():
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (c1 INTEGER, c2 REAL, c3 TEXT)")
+    db.reload_tables()
+    table: Table = db.test
+    count = table.insert_columns(c1=array('q', [1, 2, 3]), c2=memoryview(array('d', [0.5, 1.5, 2.5])), c3=["a", "b", None])
+    assert count == 3
+    assert table() == [(1, 0.5, "a"), (2, 1.5, "b"), (3, 2.5, None)]
+    try: table.insert_columns(c1=[1, 2], c2=[1.0])
+    except FortifySQLError: pass
+    else: raise Exception("columns of different lengths shouldn't be inserted")
+    try: table.insert_columns(c1=array('d', [1.5]))
+    except SQLTypeError: pass
+    else: raise Exception("REAL values shouldn't be inserted into an INTEGER column")
+    try: table.insert_columns(c1=[4, "5"])
+    except SQLTypeError: pass
+    else: raise Exception("every value should be checked, not just the first")
+
+def test_coerce_many():
+    assert coerce_many(Integer, ["1", 2, 3.0, None, True]) == [1, 2, 3, None, 1]
+    assert coerce_many(Real, (1, "2.5")) == [1.0, 2.5]
+    assert coerce_many(Text, [1, None]) == ["1", None]
+    assert coerce_many(Null, [1, 2]) == [None, None]
+    try: coerce_many(Integer, ["1", "a"])
+    except SQLTypeError: pass
+    else: raise Exception("'a' shouldn't be converted to an INTEGER")
+    for dtype, values in ((Integer, [1, float("inf")]), (Integer, [1e999]), (Real, [10 ** 400]), (Integer, [b"12"]), (Real, [1, bytearray(b"1")])):
+        try: coerce_many(dtype, values)
+        except SQLTypeError: pass
+        else: raise Exception(f"{values} shouldn't be converted to {dtype.sql_text}")
+    try: coerce(Integer, b"12")
+    except SQLTypeError: pass
+    else: raise Exception("bytes shouldn't be converted to an INTEGER")
+    assert coerce(None, b"12") == b"12" and coerce_many(None, ("1", 2)) == ["1", 2] # unknown declared types are left alone
+    assert not hasattr(Integer(1), "__dict__")
+    assert str(Null()) == "NULL"
+
+def test_get_many():
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (id INTEGER PRIMARY KEY, value TEXT)")
+    db.reload_tables()
+    table: Table = db.test
+    table.insert_columns(id=list(range(1000)), value=[str(n) for n in range(1000)])
+    keys = [999, 5, 500, 5, 2000, 1]
+    assert sorted(table.get_many(table.id, keys, chunk_size=2)) == [(1, "1"), (5, "5"), (500, "500"), (999, "999")]
+    assert list(table.get_many("id", keys, chunk_size=2, ordered=True)) == [(999, "999"), (5, "5"), (500, "500"), (1, "1")]
+    assert list(table.get_many(table.id, keys, ordered=True, temp_table_after=2)) == [(999, "999"), (5, "5"), (500, "500"), (1, "1")]
+    assert list(table.get_many(table.value, ["7", "3"], ordered=True)) == [(7, "7"), (3, "3")]
+    db.query("CREATE TABLE loose (id INT PRIMARY KEY, value VARCHAR(10))") # no known datatype, keys aren't converted
+    db.query("INSERT INTO loose (id, value) VALUES (1, 'a'), (2, 'b')")
+    db.reload_tables()
+    assert list(db.loose.get_many(db.loose.id, [2, 1, 3], ordered=True)) == [(2, "b"), (1, "a")]
+    try: table.get_many(table.id, keys, chunk_size=0)
+    except FortifySQLError: pass
+    else: raise Exception("chunk_size should be checked when get_many() is called")
+
+def test_paginate():
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (a INTEGER, b INTEGER, value TEXT, PRIMARY KEY (a, b))")
+    db.reload_tables()
+    table: Table = db.test
+    table.insert_columns(a=[n // 3 for n in range(10)], b=[n % 3 for n in range(10)], value=[str(n) for n in range(10)])
+    pages = list(table.get().paginate(order_by=(table.a, table.b), page_size=4))
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert [row[2] for page in pages for row in page] == [str(n) for n in range(10)]
+    pages = list(table.get().filter(table.a >= 1).paginate(order_by=("a", "b"), page_size=3, descending=True))
+    assert [row[2] for page in pages for row in page] == [str(n) for n in range(9, 2, -1)]
+    try: table.get(table.value).paginate(order_by=table.a)
+    except FortifySQLError: pass
+    else: raise Exception("order_by column must be selected, checked when paginate() is called")
+
+def test_join():
+    db = Database(":memory:")
+    db.query("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    db.query("CREATE TABLE posts (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users, title TEXT)")
+    db.reload_tables()
+    users: Table = db.users
+    posts: Table = db.posts
+    users.insert_columns(id=[1, 2, 3], name=["a", "b", "c"])
+    posts.insert_columns(id=[1, 2, 3], user_id=[1, 1, 2], title=["x", "y", "z"])
+    data = users.get(users.name, posts.title).join(posts).order(posts.id).all()
+    assert data == [("a", "x"), ("a", "y"), ("b", "z")]
+    data = users.get(users.name, posts.title).join(posts, on=users.id == posts.user_id, how="left").filter(id=3).all()
+    assert data == [("c", None)]
+    data = users.get(users.name, posts.title).join(posts).filter(users.id == 1).order(posts.id).all() # not ambiguous
+    assert data == [("a", "x"), ("a", "y")]
+    assert str(users.id) == "id" # joining doesn't change how the shared columns are written elsewhere
+    assert users.get(users.name).filter(id=1).all() == [("a",)]
+    try: users.get().filter(id=1).join(posts)
+    except FortifySQLError: pass
+    else: raise Exception("join after filter should raise an error")
+
+def test_import_file(tmp_path):
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (id INTEGER PRIMARY KEY, score REAL, name TEXT)")
+    db.reload_tables()
+    table: Table = db.test
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_text("id,score,name\n1,0.5,a\n2,,b\nx,1.0,c\n1,2.0,d\n3,3.5,e\n")
+    progress = []
+    stats = table.import_file(str(csv_path), chunk_size=2, reject_path=str(tmp_path / "rejects.jsonl"), progress=progress.append)
+    assert stats["rows"] == 3 and stats["rejected"] == 2 and len(progress) == 3
+    assert table() == [(1, 0.5, "a"), (2, None, "b"), (3, 3.5, "e")]
+    assert [json.loads(line)["line"] for line in (tmp_path / "rejects.jsonl").read_text().splitlines()] == [4, 5]
+
+    jsonl_path = tmp_path / "data.jsonl"
+    jsonl_path.write_text('{"id": 4, "name": "f"}\n{"id": 5, "name": "g", "other": 1}\nnot json\n{"id": 6, "name": null}\n')
+    stats = table.import_file(str(jsonl_path), format="jsonl")
+    assert stats["rows"] == 2 and stats["rejected"] == 2
+    assert list(table.get_many(table.id, [4, 6], ordered=True)) == [(4, None, "f"), (6, None, None)]
+    jsonl_path.write_text('{"id": 1e999, "name": "too big"}\n{"id": 7, "name": "h"}\n')
+    stats = table.import_file(str(jsonl_path), format="jsonl") # an out of range number only rejects its row
+    assert stats["rows"] == 1 and stats["rejected"] == 1
+
+    db.query("CREATE TABLE loose (id INT, name VARCHAR(20))") # types get_dtype() doesn't know are inserted as they are
+    db.reload_tables()
+    csv_path.write_text("id,name\n1,a\n2,b\n")
+    assert db.loose.import_file(str(csv_path))["rows"] == 2
+    assert db.loose() == [(1, "a"), (2, "b")]
+
+    db.query("CREATE TABLE sparse (id INTEGER PRIMARY KEY, score REAL NOT NULL DEFAULT 1.5, name TEXT)")
+    db.reload_tables()
+    db.error_catch(True)
+    jsonl_path.write_text('not json\n{"id": 1}\n{"id": 2, "name": "b"}\n{"id": 2, "score": 3.0}\n{"name": "d", "score": 4.0}\n')
+    stats = db.sparse.import_file(str(jsonl_path), format="jsonl", reject_path=str(tmp_path / "rejects.jsonl"))
+    assert stats["rows"] == 3 and stats["rejected"] == 2
+    assert db.sparse() == [(1, 1.5, None), (2, 1.5, "b"), (3, 4.0, "d")]
+    assert [json.loads(line)["line"] for line in (tmp_path / "rejects.jsonl").read_text().splitlines()] == [1, 4]
+
+def test_export(tmp_path):
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (id INTEGER PRIMARY KEY, score REAL, data BLOB)")
+    db.reload_tables()
+    table: Table = db.test
+    table.insert_columns(id=[1, 2, 3], score=[0.5, None, 1.5], data=[b"\x00\x01", None, b"a"])
+    assert table.export(str(tmp_path / "out.csv"), batch_size=2) == 3
+    with open(tmp_path / "out.csv", newline="") as file:
+        assert list(csv.reader(file))[:3] == [["id", "score", "data"], ["1", "0.5", "0001"], ["2", "", ""]]
+    assert table.get(table.id, table.data).filter(table.id >= 2).export(str(tmp_path / "out.jsonl.gz"), format="jsonl") == 2
+    with gzip.open(tmp_path / "out.jsonl.gz", "rt") as file:
+        assert [json.loads(line) for line in file] == [{"id": 2, "data": None}, {"id": 3, "data": "61"}]
+    db.add_banned_statement("SELECT")
+    try: table.export(str(tmp_path / "out.csv"))
+    except SecurityError: pass
+    else: raise Exception("banned SELECT shouldn't be exported")
+    assert (tmp_path / "out.csv").read_text().startswith("id,score,data") # the file isn't emptied when the query fails
+
+def test_pretty_print(capsys):
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (id INTEGER PRIMARY KEY, name TEXT)")
+    db.reload_tables()
+    table: Table = db.test
+    table.insert_columns(id=list(range(100)), name=["x" * 100] * 100)
+    printed = table.pretty_print(max_rows=5, tail=2, max_width=10)
+    assert [row[0] for row in printed] == [0, 1, 2, 98, 99]
+    output = capsys.readouterr().out
+    assert "xxxxxxx..." in output and "x" * 11 not in output and "95 rows not shown" in output
+    printed = table.get().filter(table.id < 7).pretty_print(max_rows=None, page_size=3)
+    assert len(printed) == 7 and capsys.readouterr().out.count("| id |") == 3
+    db.add_banned_statement("SELECT")
+    try: table.pretty_print()
+    except SecurityError: pass
+    else: raise Exception("pretty_print should follow the security rules")
+
+def test_open_blob():
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (id INTEGER PRIMARY KEY, data BLOB)")
+    db.reload_tables()
+    table: Table = db.test
+    buffer = bytearray(b"abc")
+    assert Blob(buffer).value is buffer and Blob(bytes_like=memoryview(buffer)).value.obj is buffer
+    table.append(id=1, data=bytes(10))
+    with table.open_blob(table.data, 1, "w") as blob:
+        blob.write(b"hello")
+        blob.seek(8)
+        blob.write(memoryview(b"!!"))
+    with table.open_blob("data", 1) as blob:
+        assert blob.read(5) == b"hello" and len(blob) == 10
+        blob.seek(8)
+        assert blob.read() == b"!!"
+    table.read_only = True
+    try: table.open_blob(table.data, 1, "w")
+    except SecurityError: pass
+    else: raise Exception("read only tables can't be written to")
+
+def test_parallel_map(tmp_path):
+    path = str(tmp_path / "parallel.db")
+    open(path, "x").close()
+    db = Database(path)
+    db.query("CREATE TABLE test (a INTEGER, b INTEGER)")
+    db.reload_tables()
+    table: Table = db.test
+    table.insert_columns(a=list(range(1000)), b=[n % 7 for n in range(1000)])
+    assert table.get(table.a, table.b).parallel_map(sum, workers=2) == [n + n % 7 for n in range(1000)]
+    assert table.get(table.a).filter(table.b == 3).parallel_map(sum, workers=2, reduce=operator.add) == sum(n for n in range(1000) if n % 7 == 3)
+    assert table.get().filter(table.b > 100).parallel_map(sum, workers=2, reduce=operator.add, initial=5) == 5
+    for select in (table.get("count(*)"), table.get(max(table.a)), table.get(table.b).group(table.b), table.get().order(table.a),
+                   table.get().filter(table.b == 1).group(table.b, having="count(*) > 1"), table.get("sum(a) OVER (ORDER BY a)")):
+        try: select.parallel_map(sum, workers=2)
+        except FortifySQLError: pass
+        else: raise Exception(f"parallel_map() should reject {select}")
+    limited = table.get()
+    limited.statement += "LIMIT 5 "
+    try: limited.parallel_map(sum, workers=2)
+    except FortifySQLError: pass
+    else: raise Exception("parallel_map() should reject LIMIT")
+    db.close()
+
+def test_change_log():
+    db = Database(":memory:")
+    db.query("CREATE TABLE test (id INTEGER PRIMARY KEY, name TEXT)")
+    db.reload_tables()
+    table = db.test
+    table.append(id=1, name="a")
+    table.enable_change_log()
+    table.enable_change_log()
+    assert table.last_change() == 0
+    table.append(id=2, name="b")
+    table.append(id=3, name="c")
+    table.replace(table.id == 2, name="bb")
+    table.replace(table.id == 3, id=4)
+    table.remove(id=1)
+    assert [change[1:] for change in table.changes_since()] == [(2, "I"), (3, "I"), (2, "U"), (3, "D"), (4, "U"), (1, "D")]
+    seq = table.last_change()
+    table.append(id=5, name="e")
+    assert [change[1:] for change in table.changes_since(seq, with_rows=True)] == [(5, "I", 5, "e")]
+    assert table.prune_changes(seq) == 6
+    assert [change[0] for change in table.changes_since()] == [seq + 1]
+    try:
+        table.disable_change_log()
+    except SecurityError:
+        pass
+    else:
+        raise Exception("disabling the change log drops tables so should follow allow_drop")
+    db.allow_drop(True)
+    table.disable_change_log()
+    assert not table.change_log_enabled()
+    try:
+        table.changes_since()
+    except FortifySQLError:
+        pass
+    else:
+        raise Exception("changes_since() without a change log should raise when it's called")
+
+def test_fulltext_index():
+    db = Database(":memory:")
+    db.query("CREATE TABLE posts (id INTEGER PRIMARY KEY, title TEXT, body TEXT)")
+    db.reload_tables()
+    posts = db.posts
+    posts.append(id=1, title="sqlite tips", body="indexes make queries fast")
+    posts.read_only = True
+    try: posts.create_fulltext_index(posts.title, "body")
+    except SecurityError: pass
+    else: raise Exception("a read only table shouldn't get a full text index")
+    posts.read_only = False
+    posts.create_fulltext_index(posts.title, "body")
+    posts.append(id=2, title="python", body="sqlite from python is fast and fast again")
+    posts.append(id=3, title="cooking", body="slow food")
+    assert posts.search("fast") == [(2, "python", "sqlite from python is fast and fast again"), (1, "sqlite tips", "indexes make queries fast")]
+    assert [row[0] for row in posts.search("sqlite", rank=False)] == [1, 2]
+    assert [row[0] for row in posts.search("title: sqlite")] == [1]
+    posts.replace(posts.id == 3, body="fast food")
+    posts.remove(id=1)
+    assert [row[0] for row in posts.search("fast", limit=1)] == [3] # shorter body ranks higher
+    assert sorted(row[0] for row in posts.search("fast")) == [2, 3]
+    posts.rebuild_fulltext_index()
+    posts.rebuild_fulltext_index(optimize=True)
+    assert sorted(row[0] for row in posts.search("fast")) == [2, 3]
+    try:
+        posts.create_fulltext_index(posts.title)
+    except FortifySQLError:
+        pass
+    else:
+        raise Exception("creating a second index should raise")
+    db.allow_drop(True)
+    posts.read_only = True
+    try:
+        posts.drop_fulltext_index()
+    except SecurityError:
+        pass
+    else:
+        raise Exception("dropping the index of a read only table should raise")
+    posts.read_only = False
+    db.reload_tables()
+    assert hasattr(db, "fortify_fts_posts")
+    posts.drop_fulltext_index()
+    assert not posts.fulltext_index_exists()
+    assert not hasattr(db, "fortify_fts_posts") and not any(str(table).startswith("fortify_fts_posts") for table in db.tables)
+
+def test_advise_indexes():
+    db = Database(":memory:")
+    db.query("CREATE TABLE people (id INTEGER PRIMARY KEY, age INTEGER, city TEXT, name TEXT)")
+    db.query("CREATE TABLE posts (id INTEGER PRIMARY KEY, user INTEGER, title TEXT)")
+    db.reload_tables()
+    db.executemany("INSERT INTO people (id, age, city, name) VALUES (?, ?, ?, ?)", ((i, i % 80, f"city {i % 50}", f"person {i}") for i in range(2000)))
+    db.executemany("INSERT INTO posts (id, user, title) VALUES (?, ?, ?)", ((i, i % 2000, f"post {i}") for i in range(4000)))
+    people, posts = db.people, db.posts
+    db.track_workload()
+    for _ in range(5):
+        people.get(people.name).filter("city = ? AND age > ?").order("age").all("city 7", 30)
+    people.get().filter(id=5).all()
+    people.get().filter(id=6).all() # the same template as id=5
+    people.get(people.name).join(posts, on=people.id == posts.user).filter(id=3).all()
+    assert sorted(entry["executions"] for entry in db.workload.values()) == [1, 2, 5]
+
+    report = db.advise_indexes()
+    assert [(item["table"], item["columns"], item["covering"]) for item in report] == \
+           [("people", ["city", "age", "name"], True), ("posts", ["user"], True)]
+    assert report[0]["executions"] == 5 and report[0]["benefit"] > 0 and report[0]["sql"].startswith("CREATE INDEX")
+    assert db.query("SELECT count(*) FROM sqlite_master WHERE type = 'index'") == [(0,)] # dry run doesn't create them
+
+    db.advise_indexes(apply=True)
+    assert db.query("SELECT count(*) FROM sqlite_master WHERE type = 'index'") == [(2,)]
+    assert db.advise_indexes() == []
+
+def test_registered_functions(tmp_path):
+    path = str(tmp_path / "functions.db")
+    open(path, "x").close()
+    db = Database(path, read_connections=1)
+    db.query("CREATE TABLE sales (day INTEGER PRIMARY KEY, region TEXT, amount REAL)")
+    db.reload_tables()
+    sales = db.sales
+    for day, (region, amount) in enumerate([("North", 10), ("south", 20), ("North", 30), ("south", 40)]):
+        sales.append(day=day, region=region, amount=amount)
+
+    @db.function
+    def shout(text):
+        return text.upper() + "!"
+
+    @db.aggregate
+    class spread:
+        def __init__(self):
+            self.values = []
+        def step(self, value):
+            self.values.append(value)
+        def finalize(self):
+            return sorted(self.values)[-1] - sorted(self.values)[0] # max is sql_functions.max in this file
+
+    @db.window_function(name="running_total")
+    class RunningTotal:
+        def __init__(self):
+            self.total = 0
+        def step(self, value):
+            self.total += value
+        def inverse(self, value):
+            self.total -= value
+        def value(self):
+            return self.total
+        def finalize(self):
+            return self.total
+
+    assert shout("hi") == "HI!" and str(shout.sql(sales.region)) == "shout(region)"
+    assert sales.get_distinct(shout.sql(sales.region)).order("day").all() == [("NORTH!",), ("SOUTH!",)]
+    assert sales.get(spread.sql(sales.amount)).group(sales.region).order("region").all() == [(20.0,), (20.0,)]
+    window = RunningTotal.sql(sales.amount, over="ORDER BY day ROWS 1 PRECEDING")
+    assert [row[0] for row in sales.get(window).order("day").all()] == [10.0, 30.0, 50.0, 70.0]
+    assert db.read_conns[0].execute("SELECT shout('x')").fetchone() == ("X!",)
+    try:
+        db.function(lambda x: x, name="bad name")
+    except FortifySQLError:
+        pass
+    else:
+        raise Exception("function names should be checked")
+    sqrt, log = db.function(math.sqrt), db.function(math.log) # C builtins, math.log has no readable signature
+    assert sqrt(16) == 4.0 and str(sqrt.sql(sales.amount)) == "sqrt(amount)"
+    assert db.query("SELECT sqrt(16), log(8, 2), log(1)") == [(4.0, 3.0, 0.0)]
+    db.close()
@@ -0,0 +1,180 @@
+"""
+Background writer used to batch Table.append() calls, see Database.write_behind()
+"""
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+from .errors import FortifySQLError
+from .sql_data_types import coerce_many
+
+_FLUSH = object() # queue markers, put in place of a table
+_STOP = object()
+
+class WriteBehind:
+    """Queues appends and writes them from a dedicated thread,
+    pending appends to the same table and columns are written with one executemany and every batch is one transaction"""
+    def __init__(self, db, max_queue: int = 10000, batch_size: int = 1000, flush_interval: float = 0.05,
+                 put_timeout: float | None = None) -> None:
+        """Queues appends and writes them from a dedicated thread
+
+        Args:
+            db (Database): database to write to, only a weak reference is kept so the database can be garbage collected
+            max_queue (int, optional): most appends that can be waiting, append() blocks when the queue is full. Defaults to 10000.
+            batch_size (int, optional): pending appends that cause a write. Defaults to 1000.
+            flush_interval (float, optional): most seconds an append waits before being written. Defaults to 0.05.
+            put_timeout (float | None, optional): seconds append() blocks on a full queue before raising, None waits forever. Defaults to None.
+        """
+        self.db = weakref.ref(db)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.closed = False
+        self.thread = threading.Thread(target=self.__run, name="fortifysql-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, table, **kw) -> Future:
+        """queues an append to a table
+
+        Args:
+            table (Table): table to append to
+            **kw: column = value
+
+        Raises:
+            FortifySQLError: if the writer is closed or the queue stayed full for put_timeout seconds
+
+        Returns:
+            Future: resolves to None once the row is committed, or to the error if it couldn't be written
+        """
+        if self.closed:
+            raise FortifySQLError("append() called on a closed write behind writer")
+        future = Future()
+        try:
+            self.queue.put((table, kw, future), timeout=self.put_timeout)
+        except queue.Full:
+            raise FortifySQLError(f"write behind queue is full ({self.queue.maxsize} appends waiting)")
+        return future
+
+    def flush(self, timeout: float | None = None) -> None:
+        """blocks until every append queued before the call is committed
+
+        Args:
+            timeout (float | None, optional): most seconds to wait. Defaults to None.
+
+        Raises:
+            FortifySQLError: if the writer is closed
+            FortifySQLError: if the calling thread has a transaction() open, the writer would wait for it forever
+        """
+        if self.closed:
+            raise FortifySQLError("flush() called on a closed write behind writer")
+        self.__check_no_transaction("flush")
+        future = Future()
+        self.queue.put((_FLUSH, None, future))
+        future.result(timeout)
+
+    def close(self) -> None:
+        """writes everything that is queued then stops the writer thread
+
+        Raises:
+            FortifySQLError: if the calling thread has a transaction() open, the writer would wait for it forever
+        """
+        if self.closed:
+            return
+        if self.thread is not threading.current_thread():
+            self.__check_no_transaction("close")
+        self.closed = True
+        future = Future()
+        self.queue.put((_STOP, None, future))
+        if self.thread is not threading.current_thread(): # the database can be garbage collected on the writer thread
+            future.result()
+            self.thread.join()
+
+    def __check_no_transaction(self, name: str) -> None:
+        """raises if waiting for the writer would deadlock, it needs db.lock which the caller's transaction() holds"""
+        db = self.db()
+        if db is not None and db.transaction_depth > 0:
+            raise FortifySQLError(f"{name}() can't wait for the write behind writer inside transaction(), call it after the transaction")
+
+    def __run(self) -> None:
+        pending = []
+        deadline = 0.0
+        while True:
+            try:
+                timeout = None if pending == [] else max(deadline - time.monotonic(), 0)
+                table, kw, future = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self.__write(pending)
+                pending = []
+                continue
+
+            if table is _FLUSH or table is _STOP:
+                self.__write(pending)
+                pending = []
+                future.set_result(None)
+                if table is _STOP:
+                    return
+                continue
+
+            if not future.set_running_or_notify_cancel(): # cancelled while it was queued
+                continue
+            if pending == []:
+                deadline = time.monotonic() + self.flush_interval
+            pending.append((table, kw, future))
+            if len(pending) >= self.batch_size:
+                self.__write(pending)
+                pending = []
+
+    def __write(self, pending: List[Tuple[Any, dict, Future]]) -> None:
+        """writes a batch of appends, anything unexpected fails the batch's futures instead of stopping the writer thread 
+        so flush() and close() can't wait forever"""
+        try:
+            self.__write_batch(pending)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+    def __write_batch(self, pending: List[Tuple[Any, dict, Future]]) -> None:
+        """writes a batch of appends in one transaction, if it fails each append is retried on its own"""
+        if pending == []:
+            return
+        groups: Dict[tuple, List[Tuple[dict, Future]]] = {}
+        for table, kw, future in pending:
+            groups.setdefault((table, tuple(kw)), []).append((kw, future))
+
+        db = pending[0][0].db # queued tables keep the database alive
+        statements = []
+        try:
+            for (table, cols), items in groups.items():
+                sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+                columns = [coerce_many(getattr(table, col).dtype, [kw[col] for kw, _ in items]) for col in cols]
+                statements.append((sql, list(zip(*columns))))
+            with db.transaction():
+                for sql, _ in statements:
+                    db._check_request(sql)
+                for sql, rows in statements:
+                    db.conn.executemany(sql, rows)
+        except Exception:
+            self.__write_each(pending)
+            return
+        for _, _, future in pending:
+            future.set_result(None)
+
+    def __write_each(self, pending: List[Tuple[Any, dict, Future]]) -> None:
+        """writes appends one at a time so only the ones that fail get an error, errors are never caught by error_catch()
+        so a failed append can't resolve as written"""
+        for table, kw, future in pending:
+            try:
+                db = table.db
+                sql, parameters = table._insert_statement(**kw)
+                with db.lock:
+                    db._check_request(sql, parameters)
+                    db._write(db.conn.execute, sql, parameters)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)